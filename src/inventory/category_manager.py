@@ -1,80 +1,152 @@
 # src/inventory/category_manager.py
 from __future__ import annotations
 
-import json
 import logging
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple, Union
 
 from src.utils.validators import normalize_name
-from src.utils.io_utils import atomic_write_text
+from src.utils.io_utils import atomic_write_bytes
+from src.utils import cat_codec, json_io
 
 logger = logging.getLogger(__name__)
 
+# cache cấp process: đường dẫn file -> ((mtime_ns, size), tên danh mục); mỗi CategoryManager
+# (vd. tạo kèm mỗi ProductManager) chỉ cần một lần stat nếu file không đổi kể từ lần đọc/ghi trước
+_NAMES_CACHE: Dict[str, Tuple[Tuple[int, int], Tuple[str, ...]]] = {}
+
 
 class CategoryManager:
     """
-    Quản lý danh mục đơn giản: load / save tên danh mục vào file JSON.
+    Quản lý danh mục đơn giản: load / save tên danh mục vào file JSON
+    (hoặc file nhị phân length-prefixed nếu storage_path có đuôi .bin).
     - uniqueness được xác định bởi normalize_name(name).
     - lưu trữ tên gốc (không thay đổi case/dấu).
     """
 
     def __init__(self, storage_path: Optional[Union[str, Path]] = None) -> None:
         self._names: List[str] = []
-        self._normalized_cache: Optional[set[str]] = None
+        # normalized name -> index trong self._names (luôn đồng bộ với _names; chỉ dùng nội bộ, không mutate từ ngoài)
+        self._normalized_cache: Dict[str, int] = {}
+        # tăng mỗi khi danh sách thay đổi; dùng để invalidate snapshot valid_name_set_normalized()
+        self.version: int = 0
+        self._valid_set: Optional[Tuple[int, FrozenSet[str]]] = None
         self.storage_path: Optional[Path] = Path(storage_path) if storage_path else None
+        # batch(): hoãn save() cho tới khi block ngoài cùng kết thúc
+        self._batch_depth: int = 0
+        self._dirty: bool = False
         if self.storage_path:
+            source = self.storage_path
+            if self._is_binary() and not source.exists():
+                # migrate: chưa có file .bin thì đọc file .json cũ cùng tên, lần save tới ghi dạng nhị phân
+                legacy = source.with_suffix(".json")
+                if legacy.is_file():
+                    source = legacy
             # Nếu path tồn tại và là file, load; nếu là thư mục hoặc không tồn tại thì bỏ qua
             try:
-                if self.storage_path.exists():
-                    if self.storage_path.is_file():
-                        text = self.storage_path.read_text(encoding="utf-8")
-                        data = json.loads(text)
-                        if isinstance(data, list):
-                            self._names = []
-                            for n in data:
-                                if isinstance(n, dict) and "name" in n:
-                                    self._names.append(str(n["name"]))
-                                elif isinstance(n, str):
-                                    self._names.append(n)
-                        else:
-                            logger.warning("Categories file %s doesn't contain a list. Ignoring.", self.storage_path)
+                if source.exists():
+                    if source.is_file():
+                        self._names = self._load_names(source)
                     else:
-                        logger.warning("storage_path %s exists but is not a file. Ignoring.", self.storage_path)
-            except (OSError, json.JSONDecodeError) as exc:
+                        logger.warning("storage_path %s exists but is not a file. Ignoring.", source)
+            except (OSError, ValueError) as exc:
+                # ValueError bao gồm cả json_io.JSONDecodeError
                 logger.warning(
-                    "Failed to load categories from %s: %s. Resetting to empty.", self.storage_path, exc
+                    "Failed to load categories from %s: %s. Resetting to empty.", source, exc
                 )
                 self._names = []
 
-            # build cache initially
-            self._rebuild_normalized_cache()
+        # build cache initially
+        self._rebuild_normalized_cache()
 
     # ---------- internal helpers ----------
+    def _is_binary(self) -> bool:
+        return bool(self.storage_path) and self.storage_path.suffix.lower() == cat_codec.SUFFIX
+
+    @classmethod
+    def _load_names(cls, path: Path) -> List[str]:
+        key = str(path.resolve())
+        st = path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = _NAMES_CACHE.get(key)
+        if cached is not None and cached[0] == stamp:
+            return list(cached[1])
+        if path.suffix.lower() == cat_codec.SUFFIX:
+            names = cat_codec.unpack(path.read_bytes())
+        else:
+            names = cls._load_json_names(path)
+        _NAMES_CACHE[key] = (stamp, tuple(names))
+        return names
+
+    @staticmethod
+    def _load_json_names(path: Path) -> List[str]:
+        data = json_io.load_path(path)
+        if data is None:
+            logger.warning("Categories file %s is empty.", path)
+            return []
+        if not isinstance(data, list):
+            logger.warning("Categories file %s doesn't contain a list. Ignoring.", path)
+            return []
+        names: List[str] = []
+        for n in data:
+            if isinstance(n, dict) and "name" in n:
+                names.append(str(n["name"]))
+            elif isinstance(n, str):
+                names.append(n)
+        return names
+
     def _rebuild_normalized_cache(self) -> None:
-        self._normalized_cache = {normalize_name(n) for n in self._names}
+        cache: Dict[str, int] = {}
+        for idx, n in enumerate(self._names):
+            # giữ index đầu tiên nếu file có tên trùng sau khi normalize
+            cache.setdefault(normalize_name(n), idx)
+        self._normalized_cache = cache
+        self.version += 1
 
-    def _normalized_set(self) -> set:
-        if self._normalized_cache is None:
-            self._rebuild_normalized_cache()
-        return set(self._normalized_cache or set())  # return a copy to avoid external mutation
+    def _persist(self) -> None:
+        """Gọi save() ngay, hoặc đánh dấu dirty nếu đang trong batch()."""
+        if self._batch_depth:
+            self._dirty = True
+            return
+        self.save()
 
     # ---------- public API ----------
+    @contextmanager
+    def batch(self) -> Iterator["CategoryManager"]:
+        """
+        Gom nhiều add/remove/rename thành một lần ghi file (một lần fsync).
+        Có thể lồng nhau; chỉ block ngoài cùng mới ghi.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty and self.storage_path:
+                self.save()
+
     def save(self) -> None:
         """
-        Ghi danh sách danh mục ra storage_path (bằng atomic_write_text).
+        Ghi danh sách danh mục ra storage_path (bằng atomic_write_bytes).
+        Đuôi .bin → định dạng nhị phân của cat_codec; còn lại → JSON.
         Raises:
             RuntimeError: nếu storage_path chưa được cấu hình.
-            Exception: propagate lỗi IO từ atomic_write_text.
+            Exception: propagate lỗi IO từ atomic_write_bytes.
         """
         if not self.storage_path:
             raise RuntimeError("No storage_path configured for CategoryManager")
 
-        # Ensure parent dir exists
+        # atomic_write_bytes tự tạo thư mục cha (mkdir một lần mỗi thư mục)
         try:
-            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
-            text = json.dumps(self._names, ensure_ascii=False, indent=2)
-            atomic_write_text(self.storage_path, text)
+            if self._is_binary():
+                payload = cat_codec.pack(self._names)
+            else:
+                payload = json_io.dumps(self._names, indent=True)
+            atomic_write_bytes(self.storage_path, payload)
+            st = self.storage_path.stat()
+            _NAMES_CACHE[str(self.storage_path.resolve())] = ((st.st_mtime_ns, st.st_size), tuple(self._names))
+            self._dirty = False
         except Exception:
             logger.exception("Failed to save categories to %s", self.storage_path)
             raise
@@ -85,7 +157,17 @@ class CategoryManager:
 
     def is_valid_name(self, name: str) -> bool:
         """Check existence by normalized name."""
-        return normalize_name(name) in self._normalized_set()
+        return normalize_name(name) in self._normalized_cache
+
+    def valid_name_set_normalized(self) -> FrozenSet[str]:
+        """
+        Snapshot bất biến các tên đã normalize (cho vòng lặp kiểm tra hàng loạt, vd. import).
+        Dùng lại cùng một frozenset cho tới khi danh mục thay đổi (theo version).
+        """
+        cached = self._valid_set
+        if cached is None or cached[0] != self.version:
+            cached = self._valid_set = (self.version, frozenset(self._normalized_cache))
+        return cached[1]
 
     def add_category(self, name: str) -> None:
         """
@@ -100,48 +182,49 @@ class CategoryManager:
 
         name = str(name).strip()
         normalized = normalize_name(name)
-        if normalized in self._normalized_set():
+        if normalized in self._normalized_cache:
             raise ValueError("Danh mục đã tồn tại")
 
         # Thêm tạm thời vào memory
         self._names.append(name)
         # cập nhật cache ngay
-        if self._normalized_cache is None:
-            self._normalized_cache = set()
-        self._normalized_cache.add(normalized)
+        self._normalized_cache[normalized] = len(self._names) - 1
+        self.version += 1
 
         # Nếu có storage, cố gắng lưu; rollback nếu lỗi
         if self.storage_path:
             try:
-                self.save()
+                self._persist()
             except Exception:
-                # rollback in-memory
-                try:
-                    self._names.remove(name)
-                except ValueError:
-                    logger.exception("Failed to remove just-added category %s after save error.", name)
-                # rebuild cache from remaining names
-                self._rebuild_normalized_cache()
+                # rollback in-memory (tên vừa append nằm ở cuối list)
+                if self._names and self._names[-1] == name:
+                    self._names.pop()
+                    self._normalized_cache.pop(normalized, None)
+                    self.version += 1
+                else:
+                    logger.error("Failed to remove just-added category %s after save error.", name)
+                    self._rebuild_normalized_cache()
                 raise
 
     def remove_category(self, name: str) -> bool:
         """
         Xóa category theo tên (so sánh normalize). Trả về True nếu xóa thành công.
         """
-        normalized = normalize_name(name)
-        for n in list(self._names):
-            if normalize_name(n) == normalized:
-                self._names.remove(n)
-                self._rebuild_normalized_cache()
-                if self.storage_path:
-                    try:
-                        self.save()
-                    except Exception:
-                        logger.exception("Failed to save after removing category %s", n)
-                        # Nếu save thất bại, ta không rollback xóa (thường cần transaction, nhưng giữ đơn giản)
-                        raise
-                return True
-        return False
+        idx = self._normalized_cache.get(normalize_name(name))
+        if idx is None:
+            return False
+
+        n = self._names.pop(idx)
+        # các index phía sau bị dịch nên build lại cache
+        self._rebuild_normalized_cache()
+        if self.storage_path:
+            try:
+                self._persist()
+            except Exception:
+                logger.exception("Failed to save after removing category %s", n)
+                # Nếu save thất bại, ta không rollback xóa (thường cần transaction, nhưng giữ đơn giản)
+                raise
+        return True
 
     def rename_category(self, old_name: str, new_name: str) -> None:
         """
@@ -151,21 +234,23 @@ class CategoryManager:
         if not new_name or not str(new_name).strip():
             raise ValueError("Tên mới không được để trống")
         normalized_new = normalize_name(new_name)
-        if normalized_new in self._normalized_set():
+        if normalized_new in self._normalized_cache:
             raise ValueError("Tên mới đã tồn tại")
 
         normalized_old = normalize_name(old_name)
-        for idx, n in enumerate(self._names):
-            if normalize_name(n) == normalized_old:
-                self._names[idx] = str(new_name).strip()
-                self._rebuild_normalized_cache()
-                if self.storage_path:
-                    try:
-                        self.save()
-                    except Exception:
-                        logger.exception("Failed to save after renaming category %s -> %s", old_name, new_name)
-                        raise
-                return
-
-        raise ValueError(f"Category '{old_name}' không tồn tại")
+        cache = self._normalized_cache
+        idx = cache.get(normalized_old)
+        if idx is None:
+            raise ValueError(f"Category '{old_name}' không tồn tại")
+
+        self._names[idx] = str(new_name).strip()
+        del cache[normalized_old]
+        cache[normalized_new] = idx
+        self.version += 1
+        if self.storage_path:
+            try:
+                self._persist()
+            except Exception:
+                logger.exception("Failed to save after renaming category %s -> %s", old_name, new_name)
+                raise
 
@@ -1,19 +1,51 @@
 # src/inventory/product.py
 from __future__ import annotations
+import csv
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from src.utils.time_zone import VN_TZ
 from dataclasses import dataclass, field
 from datetime import datetime
 from decimal import Decimal
-from typing import Any, Optional, Dict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
 
 from src.utils.validators import to_decimal, parse_iso_datetime, ensure_int
+from src.utils import json_io
 
+# Nhãn trạng thái tồn kho, index = (qty <= min_threshold) + (qty == 0)
+STOCK_STATUS_LABELS = ("Bình thường", "⚠️ Sắp hết", "🚨 Hết hàng")
 
-@dataclass
+_ZERO = Decimal("0")
+
+# Thứ tự cột khi ghi/đọc CSV (ProductManager.DEFAULT_FIELDS, Product.to_row)
+CSV_FIELDS = (
+    "product_id",
+    "name",
+    "category",
+    "cost_price",
+    "sell_price",
+    "stock_quantity",
+    "min_threshold",
+    "unit",
+    "created_date",
+    "last_updated",
+)
+
+# buffer đọc lớn cho file CSV nhiều dòng
+READ_BUFFER_SIZE = 1 << 20
+
+
+@dataclass(slots=True)
 class Product:
     """
     Model cho một sản phẩm trong kho.
     created_date / last_updated luôn là timezone-aware (UTC+7).
+    slots=True: không có __dict__ → nhẹ hơn khi load hàng chục nghìn sản phẩm;
+    không gán được thuộc tính ngoài các field khai báo.
+    Chỉ thay đổi dữ liệu qua mutator (adjust_stock, update_prices, apply_changes) hoặc
+    ProductManager.update_product, vì to_dict() được cache.
     """
     product_id: str
     name: str
@@ -23,8 +55,17 @@ class Product:
     stock_quantity: int
     min_threshold: int
     unit: str
-    created_date: Optional[datetime] = field(default_factory=lambda: datetime.now(VN_TZ))
-    last_updated: Optional[datetime] = field(default_factory=lambda: datetime.now(VN_TZ))
+    # None → __post_init__ gán thời điểm hiện tại (đọc đồng hồ một lần cho cả hai field)
+    created_date: Optional[datetime] = None
+    last_updated: Optional[datetime] = None
+    # cache kết quả to_dict(); các mutator (adjust_stock, update_prices) xóa cache
+    _dict_cache: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    # cache profit_margin_percent(); update_prices xóa cache
+    _margin: Optional[float] = field(default=None, init=False, repr=False, compare=False)
+    # cache to_csv_line(); xóa cùng _dict_cache
+    _csv_line: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    # cache to_json_bytes(); xóa cùng _dict_cache
+    _json: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         # Basic normalize + validate product_id
@@ -33,8 +74,9 @@ class Product:
             raise ValueError("product_id không được để trống")
 
         self.name = str(self.name) if self.name is not None else ""
-        self.category = str(self.category) if self.category is not None else ""
-        self.unit = str(self.unit) if self.unit is not None else ""
+        # intern: danh mục / đơn vị lặp lại trên rất nhiều sản phẩm → dùng chung một object chuỗi
+        self.category = sys.intern(str(self.category)) if self.category is not None else ""
+        self.unit = sys.intern(str(self.unit)) if self.unit is not None else ""
 
         # Convert prices / ints
         self.cost_price = to_decimal(self.cost_price)
@@ -42,21 +84,34 @@ class Product:
         self.stock_quantity = ensure_int(self.stock_quantity)
         self.min_threshold = ensure_int(self.min_threshold)
 
-        # Validate ranges using Decimal("0") for clarity
+        # Validate ranges (_ZERO: Decimal("0") dựng sẵn một lần ở module)
         if self.stock_quantity < 0:
             raise ValueError("Số lượng tồn phải >= 0")
         if self.min_threshold < 0:
             raise ValueError("Ngưỡng cảnh báo phải >= 0")
-        if self.cost_price < Decimal("0"):
+        if self.cost_price < _ZERO:
             raise ValueError("Giá nhập phải >= 0")
         if self.sell_price < self.cost_price:
             raise ValueError("Giá bán phải >= giá nhập")
 
         # Ensure timezone-aware datetimes (use parse helper and default to now)
-        self.created_date = parse_iso_datetime(self.created_date, default_now=True)
-        self.last_updated = parse_iso_datetime(self.last_updated, default_now=True)
+        now = datetime.now(VN_TZ) if self.created_date is None or self.last_updated is None else None
+        if self.created_date is None:
+            self.created_date = now
+        else:
+            self.created_date = parse_iso_datetime(self.created_date, default_now=True)
+        if self.last_updated is None:
+            self.last_updated = now
+        else:
+            self.last_updated = parse_iso_datetime(self.last_updated, default_now=True)
 
     def to_dict(self) -> Dict[str, Any]:
+        # trả về bản sao để caller sửa dict không làm hỏng cache
+        if self._dict_cache is None:
+            self._dict_cache = self._build_dict()
+        return dict(self._dict_cache)
+
+    def _build_dict(self) -> Dict[str, Any]:
         return {
             "product_id": self.product_id,
             "name": self.name,
@@ -71,7 +126,11 @@ class Product:
         }
 
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> "Product":
+    def from_dict(cls, data: Dict[str, Any], now: Optional[datetime] = None) -> "Product":
+        """
+        Tạo Product từ dict. `now` (tùy chọn) dùng cho ngày bị thiếu, để khi load
+        nhiều dòng chỉ cần đọc đồng hồ một lần cho cả batch.
+        """
         if not data.get("product_id"):
             raise ValueError("Thiếu product_id trong dữ liệu")
 
@@ -84,18 +143,218 @@ class Product:
             stock_quantity=ensure_int(data.get("stock_quantity") or 0),
             min_threshold=ensure_int(data.get("min_threshold") or 0),
             unit=str(data.get("unit") or ""),
-            created_date=parse_iso_datetime(data.get("created_date")),
-            last_updated=parse_iso_datetime(data.get("last_updated")),
+            created_date=parse_iso_datetime(data.get("created_date")) or now,
+            last_updated=parse_iso_datetime(data.get("last_updated")) or now,
         )
 
     def to_csv_row(self) -> Dict[str, Any]:
         return self.to_dict()
 
+    def to_row(self) -> Tuple[Any, ...]:
+        """Trả về tuple theo thứ tự CSV_FIELDS (dùng cho csv.writer, không tạo dict)."""
+        # dùng lại chuỗi giá/ngày đã format trong cache của to_dict (key của _build_dict theo đúng thứ tự CSV_FIELDS)
+        if self._dict_cache is None:
+            self._dict_cache = self._build_dict()
+        return tuple(self._dict_cache.values())
+
+    def to_json_bytes(self) -> bytes:
+        """JSON compact (bytes UTF-8) của to_dict(), cache lại → lưu file không encode lại sản phẩm không đổi."""
+        if self._json is None:
+            if self._dict_cache is None:
+                self._dict_cache = self._build_dict()
+            self._json = json_io.dumps(self._dict_cache)
+        return self._json
+
+    def to_csv_line(self) -> str:
+        """
+        Một dòng CSV (kết thúc CRLF như csv.writer) theo thứ tự CSV_FIELDS, cùng quy tắc quoting với csv.writer
+        (QUOTE_MINIMAL) nhưng không qua csv.writer; chỉ field chứa , " hoặc xuống dòng mới bị quote.
+        """
+        if self._csv_line is None:
+            self._csv_line = ",".join([_csv_field(v) for v in self.to_row()]) + "\r\n"
+        return self._csv_line
+
     @classmethod
-    def from_csv_row(cls, row: Dict[str, Any]) -> "Product":
+    def from_trusted_dict(cls, data: Dict[str, Any], now: Optional[datetime] = None) -> "Product":
+        """
+        Tạo Product từ dict do chính to_dict() ghi ra (file products.json của app),
+        bỏ qua __post_init__ (không validate lại giá/số lượng).
+        Dòng thiếu field, sai kiểu hoặc sai miền giá trị (tồn/ngưỡng/giá âm, giá bán < giá nhập)
+        → fallback from_dict (validate đầy đủ, cùng lỗi/mặc định như trước).
+        Không dùng cho dữ liệu người dùng nhập / file import từ bên ngoài.
+        """
+        try:
+            pid = data["product_id"]
+            stock = data["stock_quantity"]
+            min_t = data["min_threshold"]
+            name, category, unit = data["name"], data["category"], data["unit"]
+            cost_raw, sell_raw = data["cost_price"], data["sell_price"]
+        except KeyError:
+            return cls.from_dict(data, now)
+        if (type(pid) is not str or not pid or type(stock) is not int or type(min_t) is not int
+                or type(name) is not str or type(category) is not str or type(unit) is not str
+                or type(cost_raw) is not str or type(sell_raw) is not str):
+            return cls.from_dict(data, now)
+        # kiểm tra miền giá trị như __post_init__ (so sánh int/Decimal rẻ); sai → from_dict báo lỗi
+        try:
+            cost, sell = to_decimal(cost_raw), to_decimal(sell_raw)
+            in_range = stock >= 0 and min_t >= 0 and cost >= _ZERO and sell >= cost
+        except (ValueError, ArithmeticError):  # ArithmeticError: so sánh với Decimal NaN
+            in_range = False
+        if not in_range:
+            return cls.from_dict(data, now)
+        # ngày không parse được → from_dict báo lỗi (không lặng lẽ thay bằng giờ hiện tại)
+        created, updated = data.get("created_date"), data.get("last_updated")
+        try:
+            created_dt = parse_iso_datetime(created) if created else None
+            updated_dt = parse_iso_datetime(updated) if updated else None
+        except ValueError:
+            return cls.from_dict(data, now)
+        if now is None and not (created_dt and updated_dt):
+            now = datetime.now(VN_TZ)
+
+        p = object.__new__(cls)
+        p.product_id = pid
+        p.name = name
+        p.category = sys.intern(category)
+        p.unit = sys.intern(unit)
+        p.cost_price = cost
+        p.sell_price = sell
+        p.stock_quantity = stock
+        p.min_threshold = min_t
+        p.created_date = created_dt or now
+        p.last_updated = updated_dt or now
+        p._dict_cache = None
+        p._margin = None
+        p._csv_line = None
+        p._json = None
+        return p
+
+    @classmethod
+    def from_csv_row(cls, row: Dict[str, Any], now: Optional[datetime] = None) -> "Product":
         # map empty strings to None so from_dict can handle defaults
         cleaned = {k: (v if v != "" else None) for k, v in row.items()}
-        return cls.from_dict(cleaned)
+        return cls.from_dict(cleaned, now)
+
+    @classmethod
+    def iter_csv(cls, source: Union[str, Path, TextIO], now: Optional[datetime] = None) -> Iterator["Product"]:
+        """
+        Đọc CSV (đường dẫn hoặc file object đã mở) và yield từng Product.
+        Dùng csv.reader + map header→index (không tạo dict mỗi dòng như DictReader).
+        Ngữ nghĩa giống from_csv_row: ô trống / cột thiếu → giá trị mặc định; dòng trống bị bỏ qua.
+
+        Raises:
+            ValueError: nếu một dòng thiếu product_id hoặc dữ liệu không hợp lệ.
+        """
+        if isinstance(source, (str, Path)):
+            with open(source, "r", encoding="utf-8", newline="", buffering=READ_BUFFER_SIZE) as f:
+                yield from cls.iter_csv(f, now)
+            return
+
+        reader = csv.reader(source)
+        header = next(reader, None)
+        if header is None:
+            return
+        if now is None:
+            now = datetime.now(VN_TZ)  # một lần cho cả file, dùng cho các ô ngày trống
+        yield from _products_from_rows(_csv_columns(header), reader, now)
+
+    @classmethod
+    def parallel_from_csv(cls, path: Union[str, Path], n_workers: Optional[int] = None,
+                          chunksize: int = 50_000) -> List["Product"]:
+        """
+        Như list(iter_csv(path)) nhưng chia dòng thành từng chunk và dựng Product
+        song song trên nhiều process (ProcessPoolExecutor). Thứ tự dòng được giữ nguyên.
+        File có ít hơn `chunksize` dòng được đọc tuần tự (không đáng chi phí khởi tạo process).
+
+        Raises:
+            ValueError: nếu một dòng thiếu product_id hoặc dữ liệu không hợp lệ.
+        """
+        if chunksize <= 0:
+            raise ValueError("chunksize phải > 0")
+        now = datetime.now(VN_TZ)
+        with open(path, "r", encoding="utf-8", newline="", buffering=READ_BUFFER_SIZE) as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return []
+            cols = _csv_columns(header)
+            first = list(islice(reader, chunksize))
+            if len(first) < chunksize:
+                return _build_chunk(cols, first, now)
+
+            products: List[Product] = []
+            with ProcessPoolExecutor(max_workers=n_workers) as ex:
+                futures = [ex.submit(_build_chunk, cols, first, now)]
+                while True:
+                    chunk = list(islice(reader, chunksize))
+                    if not chunk:
+                        break
+                    futures.append(ex.submit(_build_chunk, cols, chunk, now))
+                for fut in futures:
+                    products.extend(fut.result())
+        return products
+
+    @classmethod
+    def parallel_encode(cls, products: Iterable["Product"], n_workers: Optional[int] = None,
+                        chunksize: int = 50_000) -> int:
+        """
+        Điền sẵn cache to_json_bytes()/to_csv_line() cho các sản phẩm chưa có cache,
+        encode song song theo chunk trên nhiều process (dùng trước khi export catalog rất lớn).
+        Ít hơn `chunksize` sản phẩm cần encode → không làm gì (encode lazy như bình thường).
+
+        Returns:
+            Số sản phẩm đã được encode song song.
+        """
+        if chunksize <= 0:
+            raise ValueError("chunksize phải > 0")
+        stale = [p for p in products if p._json is None or p._csv_line is None]
+        if len(stale) < chunksize:
+            return 0
+        chunks = [stale[i:i + chunksize] for i in range(0, len(stale), chunksize)]
+        with ProcessPoolExecutor(max_workers=n_workers) as ex:
+            for chunk, encoded in zip(chunks, ex.map(_encode_chunk, chunks)):
+                for p, (json_bytes, csv_line) in zip(chunk, encoded):
+                    p._json = json_bytes
+                    p._csv_line = csv_line
+        return len(stale)
+
+    @classmethod
+    def from_csv_rows(cls, rows: Iterable[Dict[str, Any]], now: Optional[datetime] = None) -> List["Product"]:
+        """Tạo nhiều Product; đọc đồng hồ một lần cho cả batch (dòng thiếu ngày dùng chung `now`)."""
+        if now is None:
+            now = datetime.now(VN_TZ)
+        from_row = cls.from_csv_row
+        return [from_row(row, now) for row in rows]
+
+    @classmethod
+    def from_field_tuples(cls, rows: Iterable[Sequence[Any]], now: Optional[datetime] = None) -> List["Product"]:
+        """
+        Tạo Product từ các tuple theo đúng thứ tự CSV_FIELDS (vd. các cột Arrow zip lại).
+        Ô rỗng ("") → giá trị mặc định như ô trống của CSV.
+        """
+        if now is None:
+            now = datetime.now(VN_TZ)
+        return list(_products_from_rows(list(range(len(CSV_FIELDS))), rows, now))
+
+    def stock_status(self) -> str:
+        """Trạng thái tồn kho: Bình thường / Sắp hết (qty <= min_threshold) / Hết hàng (qty == 0)."""
+        q = self.stock_quantity
+        # qty == 0 kéo theo qty <= min_threshold (min_threshold >= 0) → index 2
+        return STOCK_STATUS_LABELS[(q <= self.min_threshold) + (q == 0)]
+
+    def profit_margin_percent(self) -> float:
+        """Biên lợi nhuận (%) trên giá nhập; giá nhập = 0 → 0.0. Kết quả được cache tới khi đổi giá."""
+        if self._margin is None:
+            # tính trên tỉ số nguyên chính xác của Decimal (không tạo Decimal trung gian);
+            # int / int trong Python làm tròn đúng sang float
+            cn, cd = self.cost_price.as_integer_ratio()
+            if cn == 0:
+                self._margin = 0.0
+            else:
+                sn, sd = self.sell_price.as_integer_ratio()
+                self._margin = (sn * cd - cn * sd) * 100 / (cn * sd)
+        return self._margin
 
     # ---------- convenience mutators ----------
     def adjust_stock(self, delta: int) -> None:
@@ -114,6 +373,9 @@ class Product:
             raise ValueError("Thao tác này sẽ làm số lượng < 0")
         self.stock_quantity = new_qty
         self.last_updated = datetime.now(VN_TZ)
+        self._dict_cache = None
+        self._csv_line = None
+        self._json = None
 
     def update_prices(self, cost_price: Any = None, sell_price: Any = None) -> None:
         """
@@ -125,7 +387,7 @@ class Product:
 
         if cost_price is not None:
             new_cost = to_decimal(cost_price)
-            if new_cost < Decimal("0"):
+            if new_cost < _ZERO:
                 raise ValueError("Giá nhập phải >= 0")
         if sell_price is not None:
             new_sell = to_decimal(sell_price)
@@ -136,3 +398,105 @@ class Product:
         self.cost_price = new_cost
         self.sell_price = new_sell
         self.last_updated = datetime.now(VN_TZ)
+        self._dict_cache = None
+        self._csv_line = None
+        self._json = None
+        self._margin = None
+
+    @classmethod
+    def validate_field(cls, name: str, value: Any) -> Any:
+        """
+        Chuẩn hoá + kiểm tra một field như __post_init__ (không tạo Product mới).
+        Ràng buộc liên field (giá bán >= giá nhập) do apply_changes kiểm tra.
+
+        Raises:
+            ValueError: nếu tên field không hợp lệ / không được sửa, hoặc giá trị không hợp lệ.
+        """
+        if name == "name":
+            return str(value) if value is not None else ""
+        if name in ("category", "unit"):
+            return sys.intern(str(value)) if value is not None else ""
+        if name in ("cost_price", "sell_price"):
+            dec = to_decimal(value)
+            if name == "cost_price" and dec < _ZERO:
+                raise ValueError("Giá nhập phải >= 0")
+            return dec
+        if name in ("stock_quantity", "min_threshold"):
+            n = ensure_int(value)
+            if n < 0:
+                raise ValueError("Số lượng tồn phải >= 0" if name == "stock_quantity" else "Ngưỡng cảnh báo phải >= 0")
+            return n
+        if name in ("created_date", "last_updated"):
+            return datetime.now(VN_TZ) if value is None else parse_iso_datetime(value, default_now=True)
+        raise ValueError(f"Trường không hợp lệ: {name}")
+
+    def apply_changes(self, changes: Dict[str, Any]) -> None:
+        """
+        Sửa tại chỗ các field trong `changes` (chỉ validate field bị đổi).
+        Validate hết trước rồi mới gán → lỗi ở bất kỳ field nào thì object giữ nguyên.
+
+        Raises:
+            ValueError: như validate_field, hoặc giá bán < giá nhập sau khi đổi giá.
+        """
+        validated = {k: self.validate_field(k, v) for k, v in changes.items()}
+        if "cost_price" in validated or "sell_price" in validated:
+            cost = validated.get("cost_price", self.cost_price)
+            if validated.get("sell_price", self.sell_price) < cost:
+                raise ValueError("Giá bán phải >= giá nhập")
+            self._margin = None
+        for k, v in validated.items():
+            setattr(self, k, v)
+        self._dict_cache = None
+        self._csv_line = None
+        self._json = None
+
+
+# ---------- CSV helpers (module-level để ProcessPoolExecutor pickle được) ----------
+def _csv_field(value: Any) -> str:
+    s = "" if value is None else str(value)
+    if '"' in s or "," in s or "\n" in s or "\r" in s:
+        return '"' + s.replace('"', '""') + '"'
+    return s
+
+
+CSV_HEADER_LINE = ",".join(CSV_FIELDS) + "\r\n"
+
+
+def _csv_columns(header: List[str]) -> List[Optional[int]]:
+    """Vị trí cột của từng field trong CSV_FIELDS (None nếu file không có cột đó)."""
+    idx = {h: i for i, h in enumerate(header)}
+    return [idx.get(name) for name in CSV_FIELDS]
+
+
+def _products_from_rows(cols: List[Optional[int]], rows: Iterable[Sequence[Any]], now: datetime) -> Iterator[Product]:
+    parse_dt = parse_iso_datetime
+    width = len(CSV_FIELDS)
+    # header đúng thứ tự CSV_FIELDS (file do app ghi) → unpack trực tiếp, không map qua index
+    canonical = cols == list(range(width))
+    for row in rows:
+        if not row:
+            continue  # DictReader cũng bỏ qua dòng trống
+        n = len(row)
+        if canonical and n == width:
+            pid, name, category, cost, sell, stock, min_t, unit, created, updated = row
+        else:
+            pid, name, category, cost, sell, stock, min_t, unit, created, updated = [
+                row[i] if i is not None and i < n else "" for i in cols
+            ]
+        if not pid:
+            raise ValueError("Thiếu product_id trong dữ liệu")
+        yield Product(
+            pid, name, category,
+            cost or 0, sell or 0, stock or 0, min_t or 0,
+            unit,
+            parse_dt(created or None) or now,
+            parse_dt(updated or None) or now,
+        )
+
+
+def _build_chunk(cols: List[Optional[int]], rows: List[List[str]], now: datetime) -> List[Product]:
+    return list(_products_from_rows(cols, rows, now))
+
+
+def _encode_chunk(products: List[Product]) -> List[Tuple[bytes, str]]:
+    return [(p.to_json_bytes(), p.to_csv_line()) for p in products]
@@ -0,0 +1,142 @@
+# src/inventory/product_batch.py
+"""
+Dạng cột (pandas DataFrame) của danh sách sản phẩm, dùng cho thống kê trên toàn kho
+(đếm trạng thái tồn, biên lợi nhuận...) mà không phải tạo một Product cho mỗi dòng.
+
+Giá ở đây là float64 → chỉ dùng để phân tích/hiển thị. Thao tác sửa dữ liệu và
+tính tiền chính xác vẫn đi qua Product / ProductManager (Decimal).
+"""
+from __future__ import annotations
+
+import logging
+import weakref
+from pathlib import Path
+from typing import Any, Iterable, Tuple, Union
+
+from src.inventory.product import STOCK_STATUS_LABELS
+from src.inventory.product_feather import SUFFIXES as FEATHER_SUFFIXES
+from src.utils import json_io
+
+# Optional dependency: pandas / numpy
+try:
+    import numpy as np
+    import pandas as pd
+    _HAS_PANDAS = True
+except ImportError:
+    np = None  # type: ignore[assignment]
+    pd = None  # type: ignore[assignment]
+    _HAS_PANDAS = False
+
+logger = logging.getLogger(__name__)
+
+TEXT_COLUMNS = ("product_id", "name", "category", "unit")
+INT_COLUMNS = ("stock_quantity", "min_threshold")
+PRICE_COLUMNS = ("cost_price", "sell_price")
+DATE_COLUMNS = ("created_date", "last_updated")
+SEARCH_FIELDS = ("product_id", "name", "category")
+
+# manager -> (version, DataFrame): bảng cột dựng lại chỉ khi dữ liệu manager thay đổi
+_FRAME_CACHE: "weakref.WeakKeyDictionary[Any, Tuple[int, pd.DataFrame]]" = weakref.WeakKeyDictionary()
+
+
+def _require_pandas() -> None:
+    if not _HAS_PANDAS:
+        raise RuntimeError("pandas chưa được cài.")
+
+
+def _coerce(df: "pd.DataFrame") -> "pd.DataFrame":
+    """Ép kiểu cột; ô trống/thiếu cột → giá trị mặc định giống Product.from_dict."""
+    for c in TEXT_COLUMNS:
+        df[c] = df[c].fillna("").astype(str) if c in df else ""
+    for c in INT_COLUMNS:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64") if c in df else 0
+    for c in PRICE_COLUMNS:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0).astype("float64") if c in df else 0.0
+    for c in DATE_COLUMNS:
+        df[c] = pd.to_datetime(df[c], errors="coerce", format="ISO8601") if c in df else pd.NaT
+    return df[list(TEXT_COLUMNS + INT_COLUMNS + PRICE_COLUMNS + DATE_COLUMNS)]
+
+
+def load_products_frame(path: Union[str, Path]) -> "pd.DataFrame":
+    """
+    Đọc file sản phẩm (CSV hoặc JSON, cùng định dạng ProductManager ghi ra) thành DataFrame.
+
+    Raises:
+        RuntimeError: nếu pandas chưa được cài.
+        OSError / ValueError: nếu không đọc được file.
+    """
+    _require_pandas()
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        data = json_io.load_path(path) or []
+        df = pd.DataFrame(data)
+    elif suffix in FEATHER_SUFFIXES:
+        df = pd.read_feather(path)
+    else:
+        # đọc mọi cột dạng chuỗi bằng C parser, ép kiểu số sau (xử lý được ô trống)
+        df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""])
+    return _coerce(df)
+
+
+def products_to_frame(products: Iterable[Any]) -> "pd.DataFrame":
+    """Chuyển list Product (vd. ProductManager.list_products()) sang DataFrame."""
+    _require_pandas()
+    products = list(products)
+    df = pd.DataFrame({
+        c: [getattr(p, c) for p in products]
+        for c in TEXT_COLUMNS + INT_COLUMNS + PRICE_COLUMNS + DATE_COLUMNS
+    })
+    return _coerce(df)
+
+
+def stock_status(df: "pd.DataFrame") -> "pd.Series":
+    """Trạng thái tồn kho cho từng dòng (cùng nhãn với STOCK_STATUS_LABELS)."""
+    _require_pandas()
+    qty = df["stock_quantity"].to_numpy()
+    thr = df["min_threshold"].to_numpy()
+    idx = (qty <= thr).astype(np.int8) + (qty == 0)
+    return pd.Series(np.asarray(STOCK_STATUS_LABELS, dtype=object)[idx], index=df.index, name="stock_status")
+
+
+def margin_percent(df: "pd.DataFrame") -> "pd.Series":
+    """Biên lợi nhuận (%) trên giá nhập; giá nhập = 0 → 0."""
+    _require_pandas()
+    cost = df["cost_price"].to_numpy(dtype="float64")
+    sell = df["sell_price"].to_numpy(dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        margin = np.where(cost > 0, (sell - cost) / cost * 100.0, 0.0)
+    return pd.Series(margin, index=df.index, name="margin_percent")
+
+
+def manager_frame(manager: Any) -> "pd.DataFrame":
+    """
+    DataFrame (dạng cột) của toàn bộ sản phẩm trong ProductManager, kèm cột `<field>_lower`
+    cho SEARCH_FIELDS. Cache theo manager.version nên nhiều lần quét/thống kê liên tiếp
+    chỉ dựng bảng một lần. Không sửa DataFrame trả về (dùng chung giữa các lần gọi).
+    """
+    _require_pandas()
+    cached = _FRAME_CACHE.get(manager)
+    if cached is not None and cached[0] == manager.version:
+        return cached[1]
+    df = products_to_frame(manager.products_view())
+    for c in SEARCH_FIELDS:
+        df[f"{c}_lower"] = df[c].str.lower()
+    _FRAME_CACHE[manager] = (manager.version, df)
+    return df
+
+
+def search_mask(df: "pd.DataFrame", keyword: str, field: str = "name") -> "pd.Series":
+    """Mask dòng có `field` chứa keyword (không phân biệt hoa thường), so khớp chuỗi con không regex."""
+    _require_pandas()
+    if field not in SEARCH_FIELDS:
+        raise ValueError(f"Field tìm kiếm không hợp lệ: {field}. Chọn trong {SEARCH_FIELDS}")
+    kw = str(keyword).strip().lower()
+    col = df[f"{field}_lower"] if f"{field}_lower" in df else df[field].str.lower()
+    return col.str.contains(kw, regex=False)
+
+
+def low_stock_mask(df: "pd.DataFrame") -> "pd.Series":
+    """Mask dòng sắp hết hoặc hết hàng (stock_quantity <= min_threshold)."""
+    _require_pandas()
+    return df["stock_quantity"] <= df["min_threshold"]
@@ -0,0 +1,145 @@
+# src/inventory/product_feather.py
+"""
+Lưu/đọc danh sách sản phẩm dạng Arrow/Feather (file .feather / .arrow),
+và đọc nhanh file CSV sản phẩm bằng parser C của pyarrow.csv.
+
+Mỗi field của CSV_FIELDS là một cột; đọc file là đọc thẳng các cột đã có kiểu
+(không parse từng ô như CSV). Giá và ngày giữ dạng chuỗi giống to_dict()
+để Decimal/timezone không bị đổi khi round-trip.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import IO, Any, Iterable, List, Optional
+
+from src.inventory.product import CSV_FIELDS, Product
+from src.utils.time_zone import VN_TZ
+
+# Optional dependency: pyarrow
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    from pyarrow import feather
+    from pyarrow import ipc
+    _HAS_PYARROW = True
+except ImportError:
+    pa = None  # type: ignore[assignment]
+    pa_csv = None  # type: ignore[assignment]
+    feather = None  # type: ignore[assignment]
+    ipc = None  # type: ignore[assignment]
+    _HAS_PYARROW = False
+
+SUFFIXES = (".feather", ".arrow")
+
+INT_COLUMNS = ("stock_quantity", "min_threshold")
+
+CSV_BLOCK_SIZE = 64 << 20  # 64 MiB mỗi block khi stream CSV lớn
+
+
+def require_pyarrow() -> None:
+    if not _HAS_PYARROW:
+        raise RuntimeError("pyarrow chưa được cài (cần cho file .feather/.arrow).")
+
+
+def _schema() -> "pa.Schema":
+    return pa.schema([(f, pa.int64() if f in INT_COLUMNS else pa.string()) for f in CSV_FIELDS])
+
+
+def write_products(f: IO[bytes], products: Iterable[Product]) -> None:
+    """Ghi sản phẩm ra file object nhị phân dạng Feather (nén zstd)."""
+    require_pyarrow()
+    feather.write_feather(_products_to_table(products), f, compression="zstd")
+
+
+def read_products(source: Any, now: Optional[datetime] = None) -> List[Product]:
+    """
+    Đọc file Feather do write_products ghi ra.
+    Cột thiếu / ô null → giá trị mặc định như ô trống của CSV.
+
+    Raises:
+        RuntimeError: nếu chưa cài pyarrow.
+        ValueError: nếu thiếu product_id hoặc dữ liệu không hợp lệ (pyarrow.ArrowInvalid cũng là ValueError).
+    """
+    require_pyarrow()
+    return _table_to_products(feather.read_table(source), now)
+
+
+def read_csv_products(path: Any, now: Optional[datetime] = None) -> List[Product]:
+    """
+    Đọc file CSV sản phẩm bằng pyarrow.csv (tokenize đa luồng trong C); cột tồn kho / ngưỡng parse
+    thành int64 trong C, các cột khác đọc dạng chuỗi, rồi dựng Product như Product.iter_csv
+    (cùng quy tắc ô trống / thiếu cột).
+
+    Raises:
+        RuntimeError: nếu chưa cài pyarrow.
+        ValueError: nếu dòng có số cột sai, ô số nguyên không parse được, thiếu product_id hoặc
+            dữ liệu không hợp lệ (caller có thể fallback sang Product.iter_csv, vốn chấp nhận
+            dòng thiếu cột).
+    """
+    require_pyarrow()
+    table = pa_csv.read_csv(
+        path,
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=_csv_convert_options(),
+    )
+    return _table_to_products(table, now)
+
+
+def convert_csv(csv_path: Any, out: Any, block_size: int = CSV_BLOCK_SIZE,
+                now: Optional[datetime] = None) -> int:
+    """
+    Chuyển file CSV sản phẩm (có thể lớn hơn RAM) sang Feather theo từng block:
+    pyarrow.csv.open_csv đọc tuần tự từng record batch, mỗi batch được dựng/kiểm tra
+    thành Product rồi ghi nối vào file IPC. Bộ nhớ đỉnh ~ O(block_size), không phải O(file).
+    `out` là đường dẫn hoặc file object nhị phân; file kết quả đọc lại được bằng read_products.
+
+    Returns:
+        Số sản phẩm đã ghi.
+
+    Raises:
+        RuntimeError: nếu chưa cài pyarrow.
+        ValueError: nếu block_size <= 0, dòng có số cột sai, thiếu product_id hoặc dữ liệu không hợp lệ.
+    """
+    require_pyarrow()
+    if block_size <= 0:
+        raise ValueError("block_size phải > 0")
+    if now is None:
+        now = datetime.now(VN_TZ)  # một mốc cho mọi block (ô ngày trống)
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=_csv_convert_options(),
+    )
+    options = ipc.IpcWriteOptions(compression="zstd")
+    count = 0
+    with ipc.new_file(out, _schema(), options=options) as writer:
+        for batch in reader:
+            products = _table_to_products(pa.Table.from_batches([batch]), now)
+            writer.write_table(_products_to_table(products))
+            count += len(products)
+    return count
+
+
+def _csv_convert_options() -> "pa_csv.ConvertOptions":
+    # cột số nguyên parse thẳng trong C (ô trống → null → 0 như csv.reader); giá giữ dạng chuỗi
+    # để Decimal chính xác; giá trị không phải số nguyên → ArrowInvalid (ValueError) → caller fallback
+    return pa_csv.ConvertOptions(
+        column_types={f: pa.int64() if f in INT_COLUMNS else pa.string() for f in CSV_FIELDS},
+        strings_can_be_null=False,
+    )
+
+
+def _products_to_table(products: Iterable[Product]) -> "pa.Table":
+    rows = [p.to_row() for p in products]
+    columns = list(zip(*rows)) if rows else [()] * len(CSV_FIELDS)
+    return pa.table([pa.array(c, t) for c, t in zip(columns, _schema().types)], schema=_schema())
+
+
+def _table_to_products(table: "pa.Table", now: Optional[datetime]) -> List[Product]:
+    blank = [""] * table.num_rows
+    columns = [
+        ["" if v is None else v for v in table.column(f).to_pylist()] if f in table.column_names else blank
+        for f in CSV_FIELDS
+    ]
+    return Product.from_field_tuples(zip(*columns), now)
@@ -2,173 +2,458 @@
 # src/inventory/product_manager.py
 from __future__ import annotations
 from src.utils.time_zone import VN_TZ
-from typing import List, Optional, Any, Dict, Union
+from typing import List, Optional, Any, Dict, Iterable, Iterator, Tuple, Union
 from pathlib import Path
-import json
+from collections import OrderedDict
+from contextlib import contextmanager
 import csv
 from datetime import datetime
-import os
-import tempfile
+import hashlib
 import logging
-from .product import Product
+import os
+from .product import Product, CSV_FIELDS, CSV_HEADER_LINE
 from .category_manager import CategoryManager
+from . import product_feather
 from src.utils.validators import normalize_name
+from src.utils.io_utils import atomic_open, atomic_write_bytes
+from src.utils import json_io
 
-# Try to import centralized atomic writer; fallback to local implementation
-try:
-    from src.utils.io_utils import atomic_write_text
-except ImportError as e:
-    import logging
-    logging.getLogger(__name__).warning("Không import được atomic_write_text: %s", e)
-    atomic_write_text = None  # type: ignore
-
+try:  # optional: parse JSON tăng dần, không giữ cả file trong bộ nhớ
+    import ijson
+    _HAS_IJSON = True
+except ImportError:  # pragma: no cover
+    ijson = None
+    _HAS_IJSON = False
 
 logger = logging.getLogger(__name__)
 
-def _atomic_write_text_fallback(path: Path, text: str, encoding: str = "utf-8"):
-    """
-    Fallback atomic write: write to temp file in same directory then os.replace.
-    """
-    path.parent.mkdir(parents=True, exist_ok=True)
-    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent))
-    try:
-        # use os.fdopen to write and close the fd
-        with os.fdopen(fd, "w", encoding=encoding, newline="") as f:
-            f.write(text)
-        os.replace(tmp_path, str(path))
-    except (OSError, IOError) :
-        # cleanup
-        try:
-            os.remove(tmp_path)
-        except OSError:
-            pass
-        raise
+# buffer ghi lớn cho file CSV/JSON nhiều dòng (đọc dùng product.READ_BUFFER_SIZE)
+WRITE_BUFFER_SIZE = 1 << 20
+
+# file CSV từ cỡ này trở lên được đọc bằng pyarrow.csv (nếu có); file nhỏ đọc bằng csv.reader
+PYARROW_CSV_MIN_BYTES = 1 << 20
+
+# use_wal: ghi lại toàn bộ file (compaction) khi WAL lớn hơn tỉ lệ này so với file snapshot
+WAL_COMPACT_RATIO = 0.5
+
+# số kết quả search_products (field, keyword, exact) giữ lại theo LRU; xóa hết khi version đổi
+SEARCH_CACHE_SIZE = 128
+
+# export từ ngưỡng này trở lên: encode các sản phẩm chưa có cache song song (Product.parallel_encode)
+PARALLEL_EXPORT_MIN = 50_000
 
-# choose implementation
-_atomic_write = atomic_write_text if atomic_write_text is not None else _atomic_write_text_fallback
 
 
 class ProductManager:
     """
     Quản lý danh sách Product: load/save JSON or CSV, CRUD, apply stock changes.
     """
-    DEFAULT_FIELDS = [
-        "product_id",
-        "name",
-        "category",
-        "cost_price",
-        "sell_price",
-        "stock_quantity",
-        "min_threshold",
-        "unit",
-        "created_date",
-        "last_updated",
-    ]
+    DEFAULT_FIELDS = list(CSV_FIELDS)
 
     ALLOWED_SEARCH_FIELDS = {"product_id", "name", "category"}
 
-    def __init__(self, storage_file: Union[str, Path] = "products.json", category_mgr: Optional[CategoryManager] = None) -> None:
+    # product_id là khóa nên không sửa được qua update_product
+    _UPDATABLE_FIELDS = frozenset(CSV_FIELDS) - {"product_id"}
+
+    def __init__(self, storage_file: Union[str, Path] = "products.json", category_mgr: Optional[CategoryManager] = None,
+                 use_wal: bool = False, lazy: bool = False) -> None:
+        """
+        use_wal=True: mỗi add/update/delete chỉ append một dòng JSON vào `<storage_file>.wal`
+        (fsync) thay vì ghi lại cả file; file chính được ghi lại (và WAL xóa) khi WAL đủ lớn,
+        khi kết thúc batch() hoặc khi import. WAL còn sót luôn được replay lúc khởi tạo.
+        lazy=True: chưa đọc file lúc khởi tạo; file (và WAL) được load ở lần đầu cần tới sản phẩm
+        (khởi tạo nhanh khi chỉ dùng category_mgr...). Lỗi đọc file khi đó cũng xảy ra muộn hơn.
+        """
         self.storage_file = Path(storage_file)
-        self._use_json = self.storage_file.suffix.lower() == ".json"
+        suffix = self.storage_file.suffix.lower()
+        self._use_json = suffix == ".json"
+        # .feather / .arrow: lưu dạng cột Arrow (cần pyarrow); còn lại là CSV
+        self._use_feather = suffix in product_feather.SUFFIXES
+        if self._use_feather:
+            product_feather.require_pyarrow()
         self.category_mgr = category_mgr or CategoryManager()
-        self.products: List[Product] = []
         # version counter cho index rebuild
         self.version: int = 0
+        # product_id -> Product; dict giữ thứ tự chèn nên cũng là thứ tự khi ghi file
+        # (lazy=True: chưa gán cho tới lần truy cập đầu, xem __getattr__)
+        self._products: Dict[str, Product]
+        # index search theo field: product_id -> (lowercase, product), cùng thứ tự self._products
+        # + bucket khớp chính xác; None = chưa build (build lười ở lần search đầu)
+        self._search_index: Optional[Dict[str, Dict[str, Tuple[str, Product]]]] = None
+        self._exact_index: Optional[Dict[str, Dict[str, List[Product]]]] = None
+        # LRU kết quả search_products, hợp lệ cho self.version tại thời điểm cache
+        self._search_cache: "OrderedDict[Tuple[str, str, bool], Tuple[Product, ...]]" = OrderedDict()
+        self._search_cache_version: int = -1
+        # tuple sản phẩm cho products_view(), kèm version lúc dựng
+        self._view: Optional[Tuple[int, Tuple[Product, ...]]] = None
+        # batch(): độ sâu lồng nhau; > 0 thì hoãn ghi file tới khi block ngoài cùng kết thúc
+        self._batch_depth: int = 0
+        self._dirty: bool = False
+        # mốc thời gian dùng chung cho mọi add/update trong batch ngoài cùng (xem _now)
+        self._batch_now: Optional[datetime] = None
+        # sha256 nội dung file lưu trữ lần gần nhất (đọc/ghi) → bỏ qua ghi nếu payload không đổi
+        self._last_payload_sha256: Optional[bytes] = None
+        # write-ahead log (xem use_wal)
+        self._use_wal = use_wal
+        self._wal_path = self.storage_file.with_name(self.storage_file.name + ".wal")
+        self._wal_bytes: int = 0
+        self._snapshot_bytes: int = 0
+        self._lazy_pending = lazy
+        if not lazy:
+            self._open_storage()
+
+    def __getattr__(self, name: str) -> Any:
+        # chỉ được gọi khi thuộc tính chưa tồn tại: lazy=True → load file ở lần đầu đọc _products;
+        # sau đó _products là thuộc tính thường nên không còn chi phí kiểm tra
+        if name == "_products" and self.__dict__.get("_lazy_pending"):
+            try:
+                self._open_storage()
+            except BaseException as exc:
+                # bỏ dữ liệu load dở (vd. file đọc xong nhưng replay WAL lỗi) → lần sau load lại từ đầu
+                self.__dict__.pop("_products", None)
+                if isinstance(exc, AttributeError):
+                    # AttributeError thoát ra từ property (vd. products) sẽ bị Python hiểu là
+                    # "không có thuộc tính" → đổi kiểu để lỗi thật không bị che
+                    raise RuntimeError(f"Không load được {self.storage_file}: {exc}") from exc
+                raise
+            # chỉ hạ cờ khi load thành công → lỗi (vd. dữ liệu sai) raise lại ở mỗi lần truy cập
+            self._lazy_pending = False
+            return self._products
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def _open_storage(self) -> None:
         self._load_products()
+        if self._replay_wal():
+            # WAL sót lại từ lần chạy trước → gộp luôn vào file chính (cũng bỏ đi dòng cuối ghi dở nếu có)
+            self._save_products()
+        if self._use_wal and self.storage_file.exists():
+            self._snapshot_bytes = self.storage_file.stat().st_size
+
+    @property
+    def products(self) -> List[Product]:
+        """Bản sao list sản phẩm theo thứ tự lưu; sửa list trả về không ảnh hưởng manager."""
+        return list(self._products.values())
+
+    @products.setter
+    def products(self, value: List[Product]) -> None:
+        # gán cả list (load/import/reset); trùng product_id thì giữ bản đầu tiên (như lookup tuần tự
+        # cũ trả về bản khớp đầu tiên), các bản sau bị bỏ và sẽ không còn trong file ở lần lưu tới
+        products: Dict[str, Product] = {}
+        dropped: List[str] = []
+        for p in value:
+            if products.setdefault(p.product_id, p) is not p:
+                dropped.append(p.product_id)
+        self._products = products
+        if dropped:
+            logger.warning("Bỏ %d sản phẩm trùng product_id (giữ bản đầu tiên): %s", len(dropped), dropped)
+        self._search_index = None
+        self._exact_index = None
+        self.version = getattr(self, "version", 0) + 1
 
     # ---------------------------
     # Load / Save
     # ---------------------------
     def _load_products(self) -> None:
+        self._last_payload_sha256 = None
         if not self.storage_file.exists():
             self.products = []
             return
 
-        if self._use_json:
+        if self._use_feather:
             try:
-                text = self.storage_file.read_text(encoding="utf-8")
-                data = json.loads(text)
-                if isinstance(data, list):
-                    self.products = [Product.from_dict(d) for d in data]
+                self.products = product_feather.read_products(self.storage_file)
+                # file Arrow không byte-ổn định → so theo hash nội dung (cùng cách băm với CSV)
+                self._last_payload_sha256 = self._content_digest()
+            except (OSError, ValueError):
+                logger.exception("Failed to load products from feather. Starting with empty list.")
+                self.products = []
+        elif self._use_json:
+            try:
+                # hash lấy ngay trên vùng mmap lúc parse → chỉ đọc file một lần
+                h = hashlib.sha256()
+                data = json_io.load_path(self.storage_file, hasher=h)
+                self._last_payload_sha256 = h.digest()
+                if data is None:
+                    logger.warning("Products file %s is empty.", self.storage_file)
+                    self.products = []
+                elif isinstance(data, list):
+                    # file do chính app ghi ra → fast path không validate lại
+                    now = datetime.now(VN_TZ)
+                    self.products = [Product.from_trusted_dict(d, now) for d in data]
                 else:
                     logger.warning("Products file %s doesn't contain a list. Ignoring.", self.storage_file)
                     self.products = []
-            except (OSError, json.JSONDecodeError):
+            except (OSError, json_io.JSONDecodeError):
                 logger.exception("Failed to load products from json. Starting with empty list.")
                 self.products = []
         else:
             try:
-                with self.storage_file.open(mode="r", encoding="utf-8", newline="") as f:
-                    reader = csv.DictReader(f)
-                    self.products = [Product.from_csv_row(r) for r in reader]
+                with open(self.storage_file, "rb") as fh:
+                    self._last_payload_sha256 = hashlib.file_digest(fh, "sha256").digest()
+                    size = os.fstat(fh.fileno()).st_size
+                products: Optional[List[Product]] = None
+                if product_feather._HAS_PYARROW and size >= PYARROW_CSV_MIN_BYTES:
+                    try:
+                        products = product_feather.read_csv_products(self.storage_file)
+                    except ValueError as exc:
+                        # vd. dòng thiếu cột: csv.reader chấp nhận, pyarrow thì không
+                        logger.info("pyarrow.csv không đọc được %s (%s); dùng csv.reader.", self.storage_file, exc)
+                if products is None:
+                    products = list(Product.iter_csv(self.storage_file))
+                self.products = products
             except (OSError, csv.Error):
                 logger.exception("Failed to load products from csv. Starting with empty list.")
                 self.products = []
 
+    @classmethod
+    def _write_csv(cls, f, products: Iterable[Product]) -> None:
+        """Ghi header + một dòng mỗi sản phẩm (Product.to_csv_line, không qua csv.writer/DictWriter)."""
+        f.write(CSV_HEADER_LINE)
+        f.writelines(p.to_csv_line() for p in products)
+
+    def _persist(self, op: Optional[Tuple[str, Any]] = None) -> None:
+        """
+        Lưu ngay, hoặc chỉ đánh dấu dirty nếu đang trong batch().
+        op = ("put", Product) / ("del", product_id): thay đổi của một sản phẩm; với use_wal chỉ ghi op vào WAL.
+        """
+        if self._batch_depth:
+            self._dirty = True
+            return
+        if op is not None and self._use_wal:
+            self._append_wal(*op)
+            return
+        self._save_products()
+
+    # ---------------------------
+    # Write-ahead log
+    # ---------------------------
+    def _append_wal(self, kind: str, payload: Any) -> None:
+        if kind == "put":
+            line = b'{"op":"put","p":' + payload.to_json_bytes() + b"}\n"
+        else:
+            line = json_io.dumps({"op": kind, "id": payload}) + b"\n"
+        with open(self._wal_path, "ab") as f:
+            start = f.tell()
+            try:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                # ghi/fsync lỗi → caller rollback in-memory; cắt dòng vừa ghi dở để không bị replay
+                try:
+                    f.truncate(start)
+                except OSError:
+                    logger.exception("Không cắt được dòng WAL vừa ghi: %s", self._wal_path)
+                raise
+        self._wal_bytes += len(line)
+        if self._wal_bytes > self._snapshot_bytes * WAL_COMPACT_RATIO:
+            # op đã bền trong WAL → compaction chỉ là best-effort: lỗi thì log, giữ WAL và
+            # không raise (nếu raise, caller rollback in-memory trong khi WAL vẫn replay op này)
+            try:
+                self._save_products()
+            except Exception:
+                logger.exception("Compaction WAL %s thất bại; giữ WAL, sẽ thử lại lần sau.", self._wal_path)
+
+    def _replay_wal(self) -> bool:
+        """Áp các op trong WAL lên dữ liệu vừa load; trả về True nếu có WAL."""
+        try:
+            data = self._wal_path.read_bytes()
+        except FileNotFoundError:
+            return False
+        products = dict(self._products)
+        now = datetime.now(VN_TZ)
+        for n, line in enumerate(data.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rec = json_io.loads(line)
+            except json_io.JSONDecodeError:
+                # dòng cuối ghi dở (crash giữa chừng) → các op trước đó vẫn hợp lệ
+                logger.warning("WAL %s: dòng %d hỏng, bỏ qua phần còn lại.", self._wal_path, n)
+                break
+            if rec.get("op") == "put":
+                p = Product.from_trusted_dict(rec["p"], now)
+                products[p.product_id] = p
+            elif rec.get("op") == "del":
+                products.pop(rec.get("id"), None)
+        self.products = list(products.values())
+        self._wal_bytes = len(data)
+        return True
+
+    def _truncate_wal(self) -> None:
+        try:
+            os.remove(self._wal_path)
+        except FileNotFoundError:
+            pass
+        self._wal_bytes = 0
+
+    @contextmanager
+    def batch(self) -> Iterator["ProductManager"]:
+        """
+        Gom nhiều thao tác CRUD và chỉ ghi file một lần khi thoát block:
+
+            with pm.batch():
+                for row in rows:
+                    pm.add_product(...)
+
+        Có thể lồng nhau (vd. import_json gọi trong một batch khác); chỉ block ngoài cùng mới ghi.
+        Trong batch, lỗi ghi file chỉ xuất hiện khi thoát block (không rollback từng thao tác).
+        Mọi add/update trong batch dùng chung một mốc created_date / last_updated (xem _now).
+        Block thoát vì exception → KHÔNG ghi file: thay đổi dở dang chỉ còn trong bộ nhớ (vẫn dirty,
+        được ghi ở lần lưu / flush() tiếp theo), exception gốc được raise nguyên vẹn.
+        Không thread-safe: mọi thao tác trong block phải chạy trên cùng một thread.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._end_batch(failed=True)
+            raise
+        self._end_batch(failed=False)
+
+    def __enter__(self) -> "ProductManager":
+        """
+        `with ProductManager(...) as pm:` tương đương `with pm.batch():` — ghi file một lần khi thoát
+        bình thường; thoát vì exception thì không ghi (như batch()).
+        """
+        self._batch_depth += 1
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self._end_batch(failed=exc_type is not None)
+
+    def _end_batch(self, failed: bool) -> None:
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self._batch_now = None
+            if not failed:
+                self.flush()
+
+    def _now(self) -> datetime:
+        """
+        Thời điểm hiện tại cho created_date / last_updated. Trong batch(): đọc đồng hồ một lần ở
+        thao tác đầu tiên rồi dùng lại cho cả batch (cả lô thay đổi mang cùng một mốc thời gian).
+        """
+        if not self._batch_depth:
+            return datetime.now(VN_TZ)
+        if self._batch_now is None:
+            self._batch_now = datetime.now(VN_TZ)
+        return self._batch_now
+
+    def flush(self) -> None:
+        """Ghi file ngay nếu có thay đổi chưa lưu (vd. giữa một batch dài); không làm gì nếu không dirty."""
+        if self._dirty:
+            self._save_products()
+
     def _save_products(self) -> None:
         if self._use_json:
-            data = [p.to_dict() for p in self.products]
-            text = json.dumps(data, ensure_ascii=False, indent=2)
-            _atomic_write(self.storage_file, text)
+            # file lưu trữ: JSON compact (không indent) → nhỏ hơn ~2 lần, encode nhanh hơn
+            # ghép JSON đã cache của từng sản phẩm (= json_io.dumps(list) compact)
+            payload = b"[" + b",".join([p.to_json_bytes() for p in self._products.values()]) + b"]"
+            digest = hashlib.sha256(payload).digest()
+            if not self._is_unchanged(digest):
+                atomic_write_bytes(self.storage_file, payload)
+        elif self._use_feather:
+            digest = self._content_digest()
+            if not self._is_unchanged(digest):
+                with atomic_open(self.storage_file, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+                    product_feather.write_products(f, self._products.values())
         else:
-            self.storage_file.parent.mkdir(parents=True, exist_ok=True)
-            with self.storage_file.open(mode="w", encoding="utf-8", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=self.DEFAULT_FIELDS)
-                writer.writeheader()
-                for p in self.products:
-                    writer.writerow(p.to_csv_row())
+            # header + các dòng CSV đã cache trên Product, encode một lần; cùng bytes dùng để băm và ghi
+            payload = (CSV_HEADER_LINE + "".join([p.to_csv_line() for p in self._products.values()])).encode("utf-8")
+            digest = hashlib.sha256(payload).digest()
+            if not self._is_unchanged(digest):
+                atomic_write_bytes(self.storage_file, payload)
+        self._last_payload_sha256 = digest
+        self._dirty = False
+        if self._use_wal or self._wal_bytes:
+            # file chính đã chứa mọi thay đổi → WAL không còn cần
+            self._truncate_wal()
+            self._snapshot_bytes = self.storage_file.stat().st_size
+
+    def _content_digest(self) -> bytes:
+        """sha256 của nội dung dạng CSV (header + dòng đã cache của từng Product) = bytes file CSV."""
+        h = hashlib.sha256(CSV_HEADER_LINE.encode("utf-8"))
+        for p in self._products.values():
+            h.update(p.to_csv_line().encode("utf-8"))
+        return h.digest()
+
+    def _is_unchanged(self, digest: bytes) -> bool:
+        """True nếu file trên đĩa vẫn còn và có đúng nội dung sắp ghi."""
+        return digest == self._last_payload_sha256 and self.storage_file.exists()
 
     # ---------------------------
     # Export / Import
     # ---------------------------
-    def export_json(self, out_path: Union[str, Path]) -> None:
-        data = [p.to_dict() for p in self.products]
-        out = Path(out_path)
-        out.parent.mkdir(parents=True, exist_ok=True)
-        _atomic_write(out, json.dumps(data, ensure_ascii=False, indent=2))
+    def export_json(self, out_path: Union[str, Path], pretty: bool = False) -> None:
+        """
+        Ghi danh sách sản phẩm ra JSON dạng stream: mỗi sản phẩm một dòng, serialize lần lượt
+        (không dựng cả list dict / cả chuỗi JSON trong bộ nhớ). Ghi qua file tạm + os.replace.
+        pretty=True: thụt lề 2 khoảng trắng cho người đọc (dựng toàn bộ payload trong bộ nhớ).
+        """
+        if pretty:
+            atomic_write_bytes(out_path, json_io.dumps([p.to_dict() for p in self._products.values()], indent=True))
+            return
+        self._encode_for_export()
+        with atomic_open(out_path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write(b"[")
+            for i, p in enumerate(self._products.values()):
+                f.write(b",\n  " if i else b"\n  ")
+                f.write(p.to_json_bytes())
+            f.write(b"\n]\n" if self._products else b"]\n")
 
     def export_csv(self, out_path: Union[str, Path]) -> None:
-        out = Path(out_path)
-        out.parent.mkdir(parents=True, exist_ok=True)
-        with out.open(mode="w", encoding="utf-8", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=self.DEFAULT_FIELDS)
-            writer.writeheader()
-            for p in self.products:
-                writer.writerow(p.to_csv_row())
-
-    def import_json(self, in_path: Union[str, Path]) -> None:
-        text = Path(in_path).read_text(encoding="utf-8")
-        data = json.loads(text)
-        self.products = [Product.from_dict(d) for d in data]
-        self._save_products()
+        self._encode_for_export()
+        with atomic_open(out_path, "w", buffering=WRITE_BUFFER_SIZE) as f:
+            self._write_csv(f, self._products.values())
 
-    def import_csv(self, in_path: Union[str, Path]) -> None:
-        with Path(in_path).open(mode="r", encoding="utf-8", newline="") as f:
-            reader = csv.DictReader(f)
-            self.products = [Product.from_csv_row(r) for r in reader]
-        self._save_products()
+    def _encode_for_export(self) -> None:
+        if len(self._products) >= PARALLEL_EXPORT_MIN:
+            Product.parallel_encode(self._products.values(), chunksize=PARALLEL_EXPORT_MIN // 4)
+
+    def import_json(self, in_path: Union[str, Path], validate_categories: bool = False) -> None:
+        """
+        Nhập toàn bộ sản phẩm từ file JSON (list các object).
+        Có ijson thì parse dạng stream từng object; không thì mmap file rồi decode một lần.
+        validate_categories=True: từ chối cả file nếu có danh mục chưa tồn tại.
+        """
+        with self.batch():
+            now = self._now()
+            if _HAS_IJSON:
+                with open(in_path, "rb") as f:
+                    products = [Product.from_dict(d, now) for d in ijson.items(f, "item")]
+            else:
+                data = json_io.load_path(in_path)
+                if data is None:
+                    raise ValueError(f"File JSON rỗng: {in_path}")
+                products = [Product.from_dict(d, now) for d in data]
+            if validate_categories:
+                self._assert_categories_exist(products)
+            self.products = products
+            self._persist()
+
+    def import_csv(self, in_path: Union[str, Path], validate_categories: bool = False) -> None:
+        products = list(Product.iter_csv(Path(in_path)))
+        if validate_categories:
+            self._assert_categories_exist(products)
+        self.products = products
+        self._persist()
 
     # ---------------------------
     # Internal helpers
     # ---------------------------
-    def _find_index_by_id(self, product_id: str) -> Optional[int]:
-        for i, p in enumerate(self.products):
-            if p.product_id == product_id:
-                return i
-        return None
-
     def _assert_category_exists(self, category: str) -> None:
         if not category or not str(category).strip():
             raise ValueError("Category không được để trống")
         if not self.category_mgr.is_valid_name(category):
             raise ValueError(f"Danh mục '{category}' không hợp lệ. Có thể dùng: {self.category_mgr.get_all_names()}")
 
-    def _assert_unique_id(self, product_id: str, ignore_index: Optional[int] = None) -> None:
-        for i, p in enumerate(self.products):
-            if i == ignore_index:
-                continue
-            if p.product_id == product_id:
-                raise ValueError("Product ID đã tồn tại")
+    def _assert_categories_exist(self, products: Iterable[Product]) -> None:
+        """Kiểm tra danh mục cho cả lô: một snapshot frozenset, mỗi sản phẩm chỉ một phép `in`."""
+        valid = self.category_mgr.valid_name_set_normalized()
+        bad = sorted({p.category for p in products if normalize_name(p.category) not in valid})
+        if bad:
+            raise ValueError(f"Danh mục không hợp lệ: {bad}. Có thể dùng: {self.category_mgr.get_all_names()}")
 
     # ---------------------------
     # CRUD sản phẩm
@@ -177,6 +462,62 @@ class ProductManager:
                     cost_price: Any, sell_price: Any, stock_quantity: Any,
                     min_threshold: Any, unit: str) -> Product:
         """Thêm sản phẩm mới và lưu. Nếu lưu thất bại sẽ rollback in-memory."""
+        product = self._new_product(product_id, name, category, cost_price, sell_price,
+                                    stock_quantity, min_threshold, unit, now=self._now())
+        product_id = product.product_id
+        if product_id in self._products:
+            raise ValueError("Product ID đã tồn tại")
+
+        # thêm rồi mới lưu; rollback nếu lưu thất bại
+        self._products[product_id] = product
+        self._index_add(product)
+        try:
+            self._persist(("put", product))
+        except Exception:
+            self._index_remove(product)
+            self._products.pop(product_id, None)
+            raise
+        self.version = getattr(self, "version", 0) + 1
+        return product
+
+    def add_products(self, rows: Iterable[Dict[str, Any]]) -> List[Product]:
+        """
+        Thêm nhiều sản phẩm (mỗi row là dict tham số của add_product) và chỉ ghi file một lần.
+        Validate cả lô trước khi thêm (tất cả hoặc không): danh mục kiểm tra một lần bằng
+        frozenset, trùng product_id (với kho hoặc trong lô) → ValueError. Lưu lỗi → rollback.
+        """
+        now = self._now()
+        new: Dict[str, Product] = {}
+        for i, row in enumerate(rows, start=1):
+            try:
+                product = self._new_product(**row, now=now, check_category=False)
+            except TypeError as exc:
+                raise ValueError(f"Dòng {i}: thiếu hoặc thừa trường ({exc})") from None
+            if product.product_id in self._products or product.product_id in new:
+                raise ValueError(f"Product ID đã tồn tại: {product.product_id}")
+            new[product.product_id] = product
+        self._assert_categories_exist(new.values())
+        if not new:
+            return []
+
+        self._products.update(new)
+        for product in new.values():
+            self._index_add(product)
+        try:
+            self._persist()
+        except Exception:
+            for product in new.values():
+                self._index_remove(product)
+                self._products.pop(product.product_id, None)
+            raise
+        self.version = getattr(self, "version", 0) + 1
+        return list(new.values())
+
+    def _new_product(self, product_id: str, name: str, category: str,
+                     cost_price: Any, sell_price: Any, stock_quantity: Any,
+                     min_threshold: Any, unit: str, now: datetime,
+                     check_category: bool = True) -> Product:
+        """Validate + dựng Product mới (chưa thêm vào kho, chưa kiểm tra trùng product_id)."""
         if not product_id or not str(product_id).strip():
             raise ValueError("Product ID không được để trống")
         if not name or not str(name).strip():
@@ -184,134 +525,177 @@ class ProductManager:
         if not unit or not str(unit).strip():
             raise ValueError("Đơn vị không được để trống")
 
-        product_id = str(product_id).strip()
-        name = str(name).strip()
         category = str(category).strip()
-        unit = str(unit).strip()
-
-        self._assert_category_exists(category)
-        self._assert_unique_id(product_id)
-
-        product = Product(
-            product_id=product_id,
-            name=name,
+        if check_category:
+            self._assert_category_exists(category)
+        return Product(
+            product_id=str(product_id).strip(),
+            name=str(name).strip(),
             category=category,
             cost_price=cost_price,
             sell_price=sell_price,
             stock_quantity=stock_quantity,
             min_threshold=min_threshold,
-            unit=unit,
-            created_date=datetime.now(VN_TZ),
-            last_updated=datetime.now(VN_TZ),
+            unit=str(unit).strip(),
+            created_date=now,
+            last_updated=now,
         )
 
-        # append then try save; rollback if save fails
-        self.products.append(product)
-        try:
-            self._save_products()
-        except Exception:
-            # rollback in-memory
-            try:
-                self.products.remove(product)
-            except ValueError:
-                logger.exception("Failed to rollback product after save error: %s", product_id)
-            raise
-        self.version = getattr(self, "version", 0) + 1
-        return product
-
     def get_product(self, product_id: str) -> Product:
-        idx = self._find_index_by_id(product_id)
-        if idx is None:
-            raise ValueError("Product không tồn tại")
-        return self.products[idx]
+        try:
+            return self._products[product_id]
+        except KeyError:
+            raise ValueError("Product không tồn tại") from None
 
     def delete_product(self, product_id: str) -> None:
-        idx = self._find_index_by_id(product_id)
-        if idx is None:
+        product = self._products.pop(product_id, None)
+        if product is None:
             raise ValueError("Product không tồn tại")
-        del self.products[idx]
-        self._save_products()
+        self._index_remove(product)
+        # tăng version trước khi ghi: lỗi IO thì cache search/frame vẫn bị invalidate
         self.version = getattr(self, "version", 0) + 1
+        self._persist(("del", product_id))
 
     def update_product(self, product_id: str, **changes) -> Product:
         """Cập nhật metadata sản phẩm (không dùng để nhập/xuất kho!)."""
-        idx = self._find_index_by_id(product_id)
-        if idx is None:
-            raise ValueError("Product không tồn tại")
-        old = self.products[idx]
-
-        merged: Dict[str, Any] = {
-            'product_id': old.product_id,
-            'name': old.name,
-            'category': old.category,
-            'cost_price': old.cost_price,
-            'sell_price': old.sell_price,
-            'stock_quantity': old.stock_quantity,
-            'min_threshold': old.min_threshold,
-            'unit': old.unit,
-            'created_date': old.created_date,
-            'last_updated': datetime.now(VN_TZ),
-        }
+        product = self.get_product(product_id)
 
+        updates: Dict[str, Any] = {}
         for k, v in changes.items():
-            if k not in merged:
+            if k not in self._UPDATABLE_FIELDS:
                 raise ValueError(f"Trường không hợp lệ: {k}")
-            if k in ('name', 'category', 'unit', 'product_id') and isinstance(v, str):
-                merged[k] = v.strip()
-            else:
-                merged[k] = v
+            updates[k] = v.strip() if k in ('name', 'category', 'unit') and isinstance(v, str) else v
 
-        if not merged['name'] or not str(merged['name']).strip():
+        if 'name' in updates and (not updates['name'] or not str(updates['name']).strip()):
             raise ValueError("Tên sản phẩm không được để trống")
+        if updates.get('last_updated') is None:
+            updates['last_updated'] = self._now()
 
-        # if category changed (by normalized value), ensure exists
-        if normalize_name(merged['category']) != normalize_name(old.category):
-            self._assert_category_exists(merged['category'])
-
-        if merged['product_id'] != old.product_id:
-            self._assert_unique_id(merged['product_id'], ignore_index=idx)
+        # if category changed (by normalized value), ensure exists; bỏ qua hẳn khi không sửa category
+        if 'category' in updates and normalize_name(updates['category']) != normalize_name(product.category):
+            self._assert_category_exists(updates['category'])
 
-        new_product = Product(**merged)
-        self.products[idx] = new_product
-        self._save_products()
+        # sửa tại chỗ chỉ các field đổi (không dựng lại cả Product); lỗi validate → object giữ nguyên
+        old_keys = self._search_keys(product) if self._search_index is not None else None
+        product.apply_changes(updates)
+        self._index_update(product, old_keys)
         self.version = getattr(self, "version", 0) + 1
-        return new_product
+        self._persist(("put", product))
+        return product
 
     def list_products(self) -> List[Product]:
-        return list(self.products)
+        return list(self._products.values())
+
+    def products_view(self) -> Tuple[Product, ...]:
+        """
+        Tuple (chỉ đọc) các sản phẩm theo thứ tự lưu, cache tới khi version đổi → gọi lặp lại
+        không copy O(N). Dùng khi chỉ cần duyệt; cần list để sửa thì dùng list_products().
+        """
+        view = self._view
+        if view is None or view[0] != self.version:
+            view = self._view = (self.version, tuple(self._products.values()))
+        return view[1]
 
     # ---------------------------
     # Tồn kho
     # ---------------------------
-    def apply_stock_change(self, product_id: str, delta: int) -> Product:
+    def apply_stock_change(self, product_id: str, delta: int, now: Optional[datetime] = None) -> Product:
         """
         Cập nhật số lượng tồn kho bằng delta, trả về Product sau cập nhật.
+        now: mốc last_updated do caller đọc sẵn (vd. dùng chung với ngày giao dịch); mặc định update_product tự gán.
         """
-        idx = self._find_index_by_id(product_id)
-        if idx is None:
-            raise ValueError("Product không tồn tại")
-        product = self.products[idx]
+        product = self.get_product(product_id)
         new_qty = product.stock_quantity + int(delta)
         if new_qty < 0:
             raise ValueError("Số lượng tồn không đủ")
-        # use update_product to validate and save (it returns new Product)
-        return self.update_product(product_id, stock_quantity=new_qty, last_updated=datetime.now(VN_TZ))
+        # use update_product to validate and save (it returns new Product); last_updated do update_product gán
+        if now is not None:
+            return self.update_product(product_id, stock_quantity=new_qty, last_updated=now)
+        return self.update_product(product_id, stock_quantity=new_qty)
 
     # ---------------------------
     # Tìm kiếm
     # ---------------------------
-    def search_products(self, keyword: str, field: str = "name") -> List[Product]:
+    def search_products(self, keyword: str, field: str = "name", exact: bool = False) -> List[Product]:
         """
         Tìm kiếm sản phẩm theo trường (name/product_id/category).
+
+        exact=True: chỉ lấy sản phẩm có giá trị (không phân biệt hoa thường) bằng đúng keyword,
+        tra thẳng trong bucket thay vì quét toàn bộ.
         """
         if field not in self.ALLOWED_SEARCH_FIELDS:
             raise ValueError(f"Field tìm kiếm không hợp lệ: {field}. Chọn trong {self.ALLOWED_SEARCH_FIELDS}")
 
         keyword_norm = str(keyword).strip().lower()
-        results = []
-        for p in self.products:
-            value = getattr(p, field, "")
-            if keyword_norm in str(value).lower():
-                results.append(p)
-        return results
+        cache = self._search_cache
+        if self._search_cache_version != self.version:
+            cache.clear()
+            self._search_cache_version = self.version
+        key = (field, keyword_norm, exact)
+        hit = cache.get(key)
+        if hit is not None:
+            cache.move_to_end(key)
+            return list(hit)
+
+        self._ensure_search_index()
+        if exact:
+            result = tuple(self._exact_index[field].get(keyword_norm, ()))
+        else:
+            result = tuple(p for lowered, p in self._search_index[field].values() if keyword_norm in lowered)
+        cache[key] = result
+        if len(cache) > SEARCH_CACHE_SIZE:
+            cache.popitem(last=False)
+        return list(result)
+
+    # ---------------------------
+    # Search index (cập nhật tăng dần theo CRUD)
+    # ---------------------------
+    def _search_keys(self, product: Product) -> Dict[str, str]:
+        return {f: str(getattr(product, f, "")).lower() for f in self.ALLOWED_SEARCH_FIELDS}
+
+    def _ensure_search_index(self) -> None:
+        if self._search_index is not None:
+            return
+        self._search_index = {f: {} for f in self.ALLOWED_SEARCH_FIELDS}
+        self._exact_index = {f: {} for f in self.ALLOWED_SEARCH_FIELDS}
+        for p in self._products.values():
+            self._index_add(p)
+
+    def _index_add(self, product: Product) -> None:
+        if self._search_index is None:
+            return
+        for f, lowered in self._search_keys(product).items():
+            self._search_index[f][product.product_id] = (lowered, product)
+            self._exact_index[f].setdefault(lowered, []).append(product)
+
+    def _index_remove(self, product: Product) -> None:
+        if self._search_index is None:
+            return
+        for f, lowered in self._search_keys(product).items():
+            self._search_index[f].pop(product.product_id, None)
+            self._bucket_discard(self._exact_index[f], lowered, product)
+
+    def _index_update(self, product: Product, old_keys: Optional[Dict[str, str]]) -> None:
+        """Cập nhật index sau khi sửa product tại chỗ; old_keys = _search_keys trước khi sửa."""
+        if self._search_index is None or old_keys is None:
+            return
+        for f, lowered in self._search_keys(product).items():
+            if lowered == old_keys[f]:
+                continue
+            self._search_index[f][product.product_id] = (lowered, product)
+            buckets = self._exact_index[f]
+            self._bucket_discard(buckets, old_keys[f], product)
+            buckets.setdefault(lowered, []).append(product)
+
+    @staticmethod
+    def _bucket_discard(buckets: Dict[str, List[Product]], key: str, product: Product) -> None:
+        bucket = buckets.get(key)
+        if not bucket:
+            return
+        for i, p in enumerate(bucket):
+            if p is product:
+                del bucket[i]
+                break
+        if not bucket:
+            del buckets[key]
 
@@ -5,13 +5,16 @@ from src.utils.time_zone import VN_TZ
 from typing import Any, Dict, List, Optional, Iterable, Union
 from pathlib import Path
 from datetime import datetime, timedelta
+import codecs
 import csv
 import os
 import json
 import logging
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from src.utils.validators import parse_iso_datetime
+from src.utils import json_io
 
 # Optional dependency cho Excel export
 try:
@@ -21,6 +24,14 @@ except ImportError:
     Workbook = None
     _HAS_OPENPYXL = False
 
+# Optional dependency: pyexcelerate ghi XLSX nhanh hơn openpyxl nhiều lần
+try:
+    from pyexcelerate import Workbook as FastWorkbook
+    _HAS_PYEXCELERATE = True
+except ImportError:
+    FastWorkbook = None
+    _HAS_PYEXCELERATE = False
+
 # Logger riêng cho module
 logger = logging.getLogger(__name__)
 
@@ -28,6 +39,7 @@ logger = logging.getLogger(__name__)
 DEFAULT_ENCODING = "utf-8"
 DEFAULT_LOOKBACK_DAYS = 30
 PREDICT_SOON_DAYS = 7  # số ngày coi như "sắp hết hàng"
+WRITE_BUFFER_SIZE = 1 << 20  # 1 MiB buffer cho file export lớn
 
 # Types
 AlertProduct = Dict[str, Any]
@@ -212,6 +224,12 @@ def format_alerts_text(alerts: Alerts) -> str:
 # 💾 Export Functions
 # ==============================
 
+LOW_STOCK_CSV_FIELDS = (
+    "product_id", "name", "category", "stock_quantity", "min_threshold",
+    "unit", "needed", "type", "daily_sale_rate", "days_until_stockout", "predicted_out_soon",
+)
+
+
 def write_low_stock_alerts(
     alerts: Alerts,
     *,
@@ -228,19 +246,16 @@ def write_low_stock_alerts(
     if out_csv_path:
         path = Path(out_csv_path)
         path.parent.mkdir(parents=True, exist_ok=True)
-        fieldnames = [
-            "product_id", "name", "category", "stock_quantity", "min_threshold",
-            "unit", "needed", "type", "daily_sale_rate", "days_until_stockout", "predicted_out_soon"
-        ]
-        with path.open("w", encoding=encoding, newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
+        with path.open("w", encoding=encoding, newline="", buffering=WRITE_BUFFER_SIZE) as f:
+            writer = csv.writer(f)
+            writer.writerow(LOW_STOCK_CSV_FIELDS)
             for label, items in (("OUT_OF_STOCK", alerts.get("out_of_stock", [])),
                                  ("LOW_STOCK", alerts.get("low_stock", []))):
-                for item in items:
-                    row = {k: item.get(k, "") for k in fieldnames}
-                    row["type"] = label
-                    writer.writerow(row)
+                # ghi list theo thứ tự cột cố định, không dựng dict trung gian như DictWriter
+                writer.writerows(
+                    [label if k == "type" else item.get(k, "") for k in LOW_STOCK_CSV_FIELDS]
+                    for item in items
+                )
 
 
 def alerts_to_json(alerts: Alerts, *, ensure_ascii: bool = False) -> str:
@@ -249,37 +264,35 @@ def alerts_to_json(alerts: Alerts, *, ensure_ascii: bool = False) -> str:
 
 
 def export_alerts_xlsx(alerts: Alerts, out_xlsx_path: str = "data/low_stock_alert.xlsx") -> None:
-    """Xuất alerts sang Excel (3 sheet)."""
-    if not _HAS_OPENPYXL or Workbook is None:
+    """Xuất alerts sang Excel (3 sheet). Ưu tiên pyexcelerate (ghi cả ma trận một lần), fallback openpyxl."""
+    if not _HAS_PYEXCELERATE and (not _HAS_OPENPYXL or Workbook is None):
         raise RuntimeError("openpyxl chưa được cài.")
 
-    wb = Workbook()
     headers = ["product_id", "name", "category", "stock_quantity", "min_threshold",
                "unit", "needed", "daily_sale_rate", "days_until_stockout", "predicted_out_soon"]
-
-    # Out of stock
-    ws_oos = wb.active
-    if ws_oos is None:
-        ws_oos = wb.create_sheet("OutOfStock")
-        wb.active = ws_oos
-    ws_oos.title = "OutOfStock"
-    ws_oos.append(headers)
-    for item in alerts.get("out_of_stock", []):
-        ws_oos.append([item.get(h, "") for h in headers])
-
-    # Low stock
-    ws_low = wb.create_sheet("LowStock")
-    ws_low.append(headers)
-    for item in alerts.get("low_stock", []):
-        ws_low.append([item.get(h, "") for h in headers])
-
-    # By category
-    ws_cat = wb.create_sheet("ByCategory")
-    ws_cat.append(["category", "out_of_stock", "low_stock"])
-    for cat, stats in alerts.get("by_category", {}).items():
-        ws_cat.append([cat, stats.get("out_of_stock", 0), stats.get("low_stock", 0)])
+    sheets = [
+        ("OutOfStock", [headers] + [[item.get(h, "") for h in headers] for item in alerts.get("out_of_stock", [])]),
+        ("LowStock", [headers] + [[item.get(h, "") for h in headers] for item in alerts.get("low_stock", [])]),
+        ("ByCategory", [["category", "out_of_stock", "low_stock"]] + [
+            [cat, stats.get("out_of_stock", 0), stats.get("low_stock", 0)]
+            for cat, stats in alerts.get("by_category", {}).items()
+        ]),
+    ]
 
     Path(out_xlsx_path).parent.mkdir(parents=True, exist_ok=True)
+    if _HAS_PYEXCELERATE:
+        fast_wb = FastWorkbook()
+        for name, data in sheets:
+            fast_wb.new_sheet(name, data=data)
+        fast_wb.save(str(out_xlsx_path))
+        return
+
+    # write_only workbook: các dòng được stream ra file, không giữ cell objects trong bộ nhớ
+    wb = Workbook(write_only=True)
+    for name, data in sheets:
+        ws = wb.create_sheet(name)
+        for row in data:
+            ws.append(row)
     wb.save(str(out_xlsx_path))
 # ==============================
 # 📝 Transaction Log Reports
@@ -300,6 +313,49 @@ def format_transaction_log(transactions: List[Any]) -> str:
     return "\n".join(lines)
 
 
+TRANSACTION_LOG_FIELDS = ["transaction_id", "product_id", "trans_type", "quantity", "date", "note"]
+
+
+def _write_log_txt(transactions: List[Any], path: str, encoding: str) -> None:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(format_transaction_log(transactions), encoding=encoding)
+
+
+def _write_log_csv(rows: List[Dict[str, Any]], path: str, encoding: str) -> None:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    with p.open("w", encoding=encoding, newline="", buffering=WRITE_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerow(TRANSACTION_LOG_FIELDS)
+        writer.writerows([row.get(k) for k in TRANSACTION_LOG_FIELDS] for row in rows)
+
+
+def _write_log_json(rows: List[Dict[str, Any]], path: str, encoding: str) -> None:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    if codecs.lookup(encoding).name == "utf-8":
+        # json_io (orjson nếu có) trả thẳng bytes UTF-8 → không qua str rồi encode lại
+        p.write_bytes(json_io.dumps(rows, indent=True, default=str))
+        return
+    p.write_text(json.dumps(rows, ensure_ascii=False, indent=2, default=str), encoding=encoding)
+
+
+def _write_log_xlsx(rows: List[Dict[str, Any]], path: str) -> None:
+    wb = Workbook()
+    ws = wb.active
+    if ws is None:
+        ws = wb.create_sheet("Transactions")
+        wb.active = ws
+    ws.title = "Transactions"
+    ws.append(TRANSACTION_LOG_FIELDS)
+    for row in rows:
+        ws.append([row.get(k) for k in TRANSACTION_LOG_FIELDS])
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    wb.save(str(p))
+
+
 def export_transaction_log(
     transaction_mgr,
     *,
@@ -309,49 +365,36 @@ def export_transaction_log(
     out_xlsx_path: Optional[str] = "data/transaction_log.xlsx",
     encoding: str = DEFAULT_ENCODING,
 ) -> None:
-    """Xuất nhật ký giao dịch ra TXT, CSV, JSON, Excel."""
+    """
+    Xuất nhật ký giao dịch ra TXT, CSV, JSON, Excel.
+    Các file độc lập nhau nên được ghi song song (ThreadPoolExecutor); lỗi của bất kỳ file nào được raise lại.
+    """
 
     transactions = transaction_mgr.list_transactions()
     rows = [t.to_dict() for t in transactions]
 
-    # TXT
+    jobs: List[tuple] = []
     if out_txt_path:
-        Path(out_txt_path).parent.mkdir(parents=True, exist_ok=True)
-        Path(out_txt_path).write_text(format_transaction_log(transactions), encoding=encoding)
-
-    # CSV
+        jobs.append((_write_log_txt, transactions, out_txt_path, encoding))
     if out_csv_path:
-        Path(out_csv_path).parent.mkdir(parents=True, exist_ok=True)
-        fieldnames = ["transaction_id", "product_id", "trans_type", "quantity", "date", "note"]
-        with Path(out_csv_path).open("w", encoding=encoding, newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in rows:
-                writer.writerow(row)
-
-    # JSON
+        jobs.append((_write_log_csv, rows, out_csv_path, encoding))
     if out_json_path:
-        Path(out_json_path).parent.mkdir(parents=True, exist_ok=True)
-        Path(out_json_path).write_text(json.dumps(rows, ensure_ascii=False, indent=2, default=str), encoding=encoding)
-
-    # Excel
+        jobs.append((_write_log_json, rows, out_json_path, encoding))
     if out_xlsx_path:
-        if not _HAS_OPENPYXL or Workbook is None:   
+        if not _HAS_OPENPYXL or Workbook is None:
             logger.warning("openpyxl chưa được cài, bỏ qua export Excel.")
         else:
-            wb = Workbook()
-            ws = wb.active
-            if ws is None:
-                ws = wb.create_sheet("Transactions")
-                wb.active = ws
-            ws.title = "Transactions"
-            ws.append(["transaction_id", "product_id", "trans_type", "quantity", "date", "note"])
-            for row in rows:
-                ws.append([row.get("transaction_id"), row.get("product_id"),
-                           row.get("trans_type"), row.get("quantity"),
-                           row.get("date"), row.get("note")])
-            Path(out_xlsx_path).parent.mkdir(parents=True, exist_ok=True)
-            wb.save(str(out_xlsx_path))
+            jobs.append((_write_log_xlsx, rows, out_xlsx_path))
+
+    if len(jobs) <= 1:
+        for fn, *args in jobs:
+            fn(*args)
+        return
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as ex:
+        futures = [ex.submit(fn, *args) for fn, *args in jobs]
+        for fut in futures:
+            fut.result()
 
 # ==============================
 # 🚀 Main Entry
@@ -416,9 +459,15 @@ def compute_financial_summary(
     # map products by id for quick lookup
     products = {p.product_id: p for p in product_mgr.list_products()}
 
-    total_revenue = Decimal("0")
-    total_cost = Decimal("0")
+    # Giá (sell, cost) dạng Decimal, convert một lần cho mỗi sản phẩm thay vì mỗi giao dịch
+    zero_prices = (Decimal("0"), Decimal("0"))
+    prices = {
+        pid: (Decimal(str(p.sell_price)), Decimal(str(p.cost_price)))
+        for pid, p in products.items()
+    }
+
     qty_by_product: Dict[str, int] = defaultdict(int)
+    imported_qty: Dict[str, int] = defaultdict(int)
 
     # iterate transactions
     transactions = list(transaction_mgr.list_transactions()) 
@@ -436,6 +485,7 @@ def compute_financial_summary(
             return True
         return (dt.month == int(month)) and (dt.year == int(year))
 
+    # Pass 1: chỉ cộng dồn số lượng theo sản phẩm (int), chưa nhân giá
     for t in transactions:
         # get transaction date and skip if not in requested period
         tdate = getattr(t, "date", None)
@@ -448,27 +498,21 @@ def compute_financial_summary(
         if not pid or qty <= 0:
             continue
 
-        prod = products.get(pid)
         if ttype in ("EXPORT", "OUT"):
-            # revenue = sell_price * qty; cost = cost_price * qty
-            if prod is not None:
-                sell = Decimal(str(prod.sell_price))
-                cost = Decimal(str(prod.cost_price))
-            else:
-                # unknown product: treat prices as 0
-                sell = Decimal("0")
-                cost = Decimal("0")
-            total_revenue += sell * qty
-            total_cost += cost * qty
             qty_by_product[pid] += qty
         elif ttype == "IMPORT":
-            # purchase increases inventory cost but not revenue; treat as cost
-            if prod is not None:
-                cost = Decimal(str(prod.cost_price))
-            else:
-                cost = Decimal("0")
-            total_cost += cost * qty
-            # do not count imports in sold quantities
+            # purchase increases inventory cost but not revenue; do not count in sold quantities
+            imported_qty[pid] += qty
+
+    # Pass 2: mỗi sản phẩm nhân giá đúng một lần (unknown product: giá = 0)
+    total_revenue = Decimal("0")
+    total_cost = Decimal("0")
+    for pid, qty in qty_by_product.items():
+        sell, cost = prices.get(pid, zero_prices)
+        total_revenue += sell * qty
+        total_cost += cost * qty
+    for pid, qty in imported_qty.items():
+        total_cost += prices.get(pid, zero_prices)[1] * qty
 
     total_profit = total_revenue - total_cost
     # by-category aggregation (fix: ensure all categories counted)
@@ -478,8 +522,7 @@ def compute_financial_summary(
         cat = (getattr(prod, "category", None) or "UNCATEGORIZED").strip()
         if cat not in by_category:
             by_category[cat] = {"revenue": Decimal("0"), "cost": Decimal("0"), "profit": Decimal("0"), "quantity": 0}
-        sell = Decimal(str(getattr(prod, "sell_price", "0"))) if prod else Decimal("0")
-        cost = Decimal(str(getattr(prod, "cost_price", "0"))) if prod else Decimal("0")
+        sell, cost = prices.get(pid, zero_prices)
         by_category[cat]["revenue"] += sell * sold_qty
         by_category[cat]["cost"] += cost * sold_qty
         by_category[cat]["profit"] += (sell - cost) * sold_qty
@@ -503,14 +546,10 @@ def compute_financial_summary(
         res = []
         for pid, qty in items_list[:top_k]:
             p = products.get(pid)
-            if p is not None:
-                revenue = Decimal(str(p.sell_price)) * qty
-                cost = Decimal(str(p.cost_price)) * qty
-                profit = revenue - cost
-            else:
-                revenue = Decimal("0")
-                cost = Decimal("0")
-                profit = Decimal("0")
+            sell, unit_cost = prices.get(pid, zero_prices)
+            revenue = sell * qty
+            cost = unit_cost * qty
+            profit = revenue - cost
             res.append({
                 "product_id": pid,
                 "name": p.name if p is not None else "",
@@ -551,57 +590,49 @@ def compute_financial_summary(
             out_path = save_dir / fname  # <-- Sửa ở đây
 
             # Ghi file (giữ nguyên code ghi CSV)
-            with out_path.open("w", encoding=DEFAULT_ENCODING, newline="") as f:
+            with out_path.open("w", encoding=DEFAULT_ENCODING, newline="", buffering=WRITE_BUFFER_SIZE) as f:
                 writer = csv.writer(f)
                 cur = summary.get("currency", "") or ""
 
                 def with_cur(val: Any) -> str:
                     return f"{val} {cur}" if (val is not None and cur) else (str(val) if val is not None else "")
 
-                # Summary header
-                writer.writerow(["Key", "Value"])
-                writer.writerow(["total_revenue", with_cur(summary["total_revenue"])])
-                writer.writerow(["total_cost", with_cur(summary["total_cost"])])
-                writer.writerow(["total_profit", with_cur(summary["total_profit"])])
-                writer.writerow(["currency", summary["currency"]])
-                writer.writerow([])
-                # By category
-                writer.writerow(["By Category"])
-                writer.writerow(["category", "revenue", "cost", "profit", "quantity"])
-                for cat, stats in summary["by_category"].items():
-                    writer.writerow([
-                        cat,
-                        with_cur(stats.get("revenue", "0")),
-                        with_cur(stats.get("cost", "0")),
-                        with_cur(stats.get("profit", "0")),
-                        stats.get("quantity", 0),
-                    ])
-                writer.writerow([])
-                # Top sellers
-                writer.writerow(["Top Sellers"])
-                writer.writerow(["name", "category", "quantity_sold", "revenue", "cost", "profit"])
-                for it in summary["top_sellers"]:
-                    writer.writerow([
+                def money_rows(items: Iterable[Dict[str, Any]]) -> Iterable[List[Any]]:
+                    return ([
                         it.get("name", ""),
                         it.get("category", ""),
                         it.get("quantity_sold", 0),
                         with_cur(it.get("revenue", "0")),
                         with_cur(it.get("cost", "0")),
                         with_cur(it.get("profit", "0")),
-                    ])
-                writer.writerow([])
+                    ] for it in items)
+
+                # mỗi section ghi bằng một lần writerows (không gọi writerow theo từng dòng)
+                # Summary header
+                writer.writerows([
+                    ["Key", "Value"],
+                    ["total_revenue", with_cur(summary["total_revenue"])],
+                    ["total_cost", with_cur(summary["total_cost"])],
+                    ["total_profit", with_cur(summary["total_profit"])],
+                    ["currency", summary["currency"]],
+                    [],
+                    # By category
+                    ["By Category"],
+                    ["category", "revenue", "cost", "profit", "quantity"],
+                ])
+                writer.writerows([
+                    cat,
+                    with_cur(stats.get("revenue", "0")),
+                    with_cur(stats.get("cost", "0")),
+                    with_cur(stats.get("profit", "0")),
+                    stats.get("quantity", 0),
+                ] for cat, stats in summary["by_category"].items())
+                # Top sellers
+                writer.writerows([[], ["Top Sellers"], ["name", "category", "quantity_sold", "revenue", "cost", "profit"]])
+                writer.writerows(money_rows(summary["top_sellers"]))
                 # Least purchased
-                writer.writerow(["Least Purchased"])
-                writer.writerow(["name", "category", "quantity_sold", "revenue", "cost", "profit"])
-                for it in summary["least_purchased"]:
-                    writer.writerow([
-                        it.get("name", ""),
-                        it.get("category", ""),
-                        it.get("quantity_sold", 0),
-                        with_cur(it.get("revenue", "0")),
-                        with_cur(it.get("cost", "0")),
-                        with_cur(it.get("profit", "0")),
-                    ])
+                writer.writerows([[], ["Least Purchased"], ["name", "category", "quantity_sold", "revenue", "cost", "profit"]])
+                writer.writerows(money_rows(summary["least_purchased"]))
 
             logger.info("Wrote sales summary CSV: %s", str(out_path))
 
@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 import difflib
 from collections import Counter
 from src.utils.time_zone import VN_TZ
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import unicodedata
 # Try import rapidfuzz.fuzz; if not present, set _fuzz = None.
 # Use "type: ignore[import]" so static checkers won't complain about optional third-party module.
@@ -65,6 +65,7 @@ class SearchEngine:
         self.trans_mgr = trans_mgr
         self._index = None
         self._index_version = None
+        self._popularity_cache: Optional[Tuple[List[Any], int, Counter]] = None
 
     # ------------------------
     # INDEX MANAGEMENT
@@ -78,7 +79,7 @@ class SearchEngine:
 
     def _build_index(self) -> None:
         """Xây index đơn giản cho tìm kiếm non-inverted (in-memory)."""
-        products = self.product_mgr.list_products()
+        products = self.product_mgr.products_view()
         self._index = []
         for p in products:
             self._index.append({
@@ -89,6 +90,10 @@ class SearchEngine:
                 "product_id_plain": normalize_name(p.product_id, ascii_only=True),
                 "name_plain": normalize_name(p.name, ascii_only=True),
                 "category_plain": normalize_name(p.category, ascii_only=True),
+                # bỏ dấu + lowercase sẵn cho autocomplete (không tính lại mỗi lần gõ phím)
+                "product_id_noacc": _remove_accents(p.product_id),
+                "name_noacc": _remove_accents(p.name),
+                "category_noacc": _remove_accents(p.category),
             })
 
     # ------------------------
@@ -118,17 +123,21 @@ class SearchEngine:
         if field and field not in allowed:
             raise ValueError(f"Field '{field}' không hợp lệ. Hỗ trợ: {allowed}")
 
+        # chuẩn hóa keyword/category và tên key của index một lần cho cả lượt tìm (không lặp lại theo từng sản phẩm)
+        category_norm = normalize_name(category) if category else None
+        field_keys = [(f, f + "_norm", f + "_plain") for f in ([field] if field else list(allowed))]
+        popularity_of = self._popularity_counts()
+
         results = []
         for entry in self._index:
             p = entry["product"]
 
-            if category and normalize_name(p.category) != normalize_name(category):
+            if category_norm is not None and entry["category_norm"] != category_norm:
                 continue
 
-            fields_to_check = [field] if field else list(allowed)
-            for f in fields_to_check:
-                norm_val = entry.get(f + "_norm", "")
-                plain_val = entry.get(f + "_plain", "")
+            for f, norm_key, plain_key in field_keys:
+                norm_val = entry.get(norm_key, "")
+                plain_val = entry.get(plain_key, "")
 
                 if norm_val.startswith(kw_norm) or plain_val.startswith(kw_plain):
                     score, match_type = 300, "prefix"
@@ -140,7 +149,7 @@ class SearchEngine:
                     continue
 
                 # Popularity boost (sản phẩm bán chạy hơn → + điểm)
-                popularity = self._get_product_popularity(p.product_id)
+                popularity = popularity_of.get(p.product_id, 0)
                 score += min(50, popularity)
 
                 results.append({
@@ -198,11 +207,26 @@ class SearchEngine:
                 _fuzzy_fallback(kw_norm, val_norm, threshold)
                 or _fuzzy_fallback(kw_plain, val_plain, threshold)
         )
+
+    def _popularity_counts(self) -> Counter:
+        """Số lần bán (EXPORT) của mọi sản phẩm, đếm trong một lượt duyệt transactions.
+
+        Kết quả được cache theo (list transactions, số lượng): log chỉ append nên
+        chừng nào hai giá trị này không đổi thì Counter vẫn đúng.
+        """
+        if not self.trans_mgr:
+            return Counter()
+        txs = self.trans_mgr.transactions
+        cached = self._popularity_cache
+        if cached is not None and cached[0] is txs and cached[1] == len(txs):
+            return cached[2]
+        counts = Counter(t.product_id for t in txs if t.trans_type == "EXPORT")
+        self._popularity_cache = (txs, len(txs), counts)
+        return counts
+
     def _get_product_popularity(self, product_id: str) -> int:
         """Độ phổ biến sản phẩm dựa trên số lần bán (EXPORT)."""
-        if not self.trans_mgr:
-            return 0
-        return sum(1 for t in self.trans_mgr.list_transactions() if t.product_id == product_id and t.trans_type == "EXPORT")
+        return self._popularity_counts()[product_id]
 
     # ------------------------
     # AUTOCOMPLETE
@@ -224,12 +248,12 @@ class SearchEngine:
         pref_norm = _remove_accents(prefix).lower().strip()
         seen, suggestions = set(), []
 
+        key = f"{field}_noacc"
         for entry in self._index:
             val = getattr(entry["product"], field, "")
             if not val:
                 continue
-            val_norm = _remove_accents(val).lower()
-            if val_norm.startswith(pref_norm):
+            if entry[key].startswith(pref_norm):
                 if val not in seen:
                     seen.add(val)
                     suggestions.append(val)
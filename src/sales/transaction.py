@@ -3,7 +3,8 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence, Tuple
+import sys
 import uuid
 import logging
 from src.utils.time_zone import VN_TZ
@@ -32,11 +33,12 @@ class Transaction:
             self.transaction_id = f"T{uuid.uuid4().hex}"
 
         # normalize / validate fields
-        self.product_id = str(self.product_id).strip()
+        # intern: mỗi sản phẩm có nhiều giao dịch, chỉ có 2 loại giao dịch → dùng chung object chuỗi
+        self.product_id = sys.intern(str(self.product_id).strip())
         if not self.product_id:
             raise ValueError("product_id không được để trống")
 
-        self.trans_type = str(self.trans_type).upper()
+        self.trans_type = sys.intern(str(self.trans_type).upper())
         if self.trans_type not in ("IMPORT", "EXPORT"):
             raise ValueError("Loại giao dịch phải là 'IMPORT' hoặc 'EXPORT'")
 
@@ -65,6 +67,38 @@ class Transaction:
             "note": self.note,
         }
 
+    def to_row(self) -> Tuple[Any, ...]:
+        """Trả về tuple theo thứ tự TransactionManager.DEFAULT_FIELDS (dùng cho csv.writer)."""
+        return (
+            self.transaction_id,
+            self.product_id,
+            self.trans_type,
+            self.quantity,
+            self.date.isoformat() if self.date else None,
+            self.note,
+        )
+
+    @classmethod
+    def from_row(cls, row: Sequence[str]) -> "Transaction":
+        """
+        Tạo Transaction từ một dòng CSV đúng thứ tự TransactionManager.DEFAULT_FIELDS
+        (file do chính app ghi) — không dựng dict, không dò tên trường cũ như from_dict.
+        """
+        tid, pid, ttype, qty_raw, date_raw, note = row
+        if not pid or not pid.strip():
+            raise ValueError("Missing product_id in transaction data")
+        if not ttype:
+            raise ValueError("Missing transaction type in transaction data")
+        # __post_init__ lo phần còn lại: strip/upper, quantity > 0, parse ngày (ô trống → now)
+        return cls(
+            transaction_id=tid or f"T{uuid.uuid4().hex}",
+            product_id=pid,
+            trans_type=ttype,
+            quantity=qty_raw,
+            date=date_raw or None,
+            note=note,
+        )
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Transaction":
         """
@@ -2,11 +2,7 @@
 from __future__ import annotations
 
 import csv
-import io
-import json
 import logging
-import os
-import tempfile
 import uuid
 from datetime import datetime
 from src.utils.time_zone import VN_TZ
@@ -19,33 +15,15 @@ from src.inventory.product_manager import ProductManager
 
 # utilities
 from src.utils.validators import parse_iso_datetime  # moved to top to avoid inline imports
-try:
-    from src.utils.io_utils import atomic_write_text as _atomic_write_text  # prefer central helper
-except Exception:
-    _atomic_write_text = None  # fallback will be used
+from src.utils.io_utils import atomic_open, atomic_write_bytes, open_with_parent_dir
+from src.utils import json_io
 
 logger = logging.getLogger(__name__)
 # NOTE: Do NOT call logging.basicConfig() inside library modules.
 
-
-def _atomic_write_fallback(path: Path, text: str, encoding: str = "utf-8") -> None:
-    """Fallback atomic write implementation (write to temp file then replace)."""
-    path.parent.mkdir(parents=True, exist_ok=True)
-    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent))
-    try:
-        with os.fdopen(fd, "w", encoding=encoding, newline="") as f:
-            f.write(text)
-        os.replace(tmp_path, str(path))
-    except (OSError, IOError):
-        try:
-            os.remove(tmp_path)
-        except OSError:
-            pass
-        raise
-
-
-# choose implementation
-_atomic_write = _atomic_write_text if _atomic_write_text is not None else _atomic_write_fallback
+# buffer đọc/ghi lớn cho file giao dịch nhiều dòng
+READ_BUFFER_SIZE = 1 << 20
+WRITE_BUFFER_SIZE = 1 << 20
 
 
 class TransactionManager:
@@ -74,33 +52,59 @@ class TransactionManager:
             return
 
         try:
-            with self.storage_file.open(mode="r", encoding="utf-8", newline="") as f:
-                reader = csv.DictReader(f)
+            # set các id đã gặp: kiểm tra trùng O(1) thay vì quét lại cả list mỗi dòng
+            seen_ids = set()
+            with self.storage_file.open(mode="r", encoding="utf-8", newline="", buffering=READ_BUFFER_SIZE) as f:
+                # csv.reader + một lần so header: file do app ghi (đúng DEFAULT_FIELDS) đi fast path
+                # Transaction.from_row; header khác (tên cột cũ, thứ tự khác) thì zip thành dict
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if header is None:
+                    return
+                canonical = header == self.DEFAULT_FIELDS
+                width = len(header)
                 for i, row in enumerate(reader, start=1):
+                    if not row:
+                        continue  # DictReader cũng bỏ qua dòng trống
                     try:
-                        t = Transaction.from_dict(row)
+                        if canonical and len(row) == width:
+                            t = Transaction.from_row(row)
+                        else:
+                            t = Transaction.from_dict(dict(zip(header, row)))
                         # ensure unique id
-                        if any(existing.transaction_id == t.transaction_id for existing in self.transactions):
+                        if t.transaction_id in seen_ids:
                             logger.warning(
                                 "Duplicate transaction_id %s at row %s - generating new id",
                                 t.transaction_id, i
                             )
                             t.transaction_id = self._generate_transaction_id()
+                        seen_ids.add(t.transaction_id)
                         self.transactions.append(t)
                     except Exception:
                         logger.exception("Skipping bad transaction row %s. Row content: %s", i, row)
         except Exception:
             logger.exception("Failed to read transactions file %s", self.storage_file)
 
+    def _write_csv(self, out: Path, transactions: List[Transaction]) -> None:
+        """
+        Ghi header + một dòng mỗi giao dịch thẳng vào file tạm (atomic) bằng csv.writer.
+        Chỉ một lớp buffer (buffer của file); không dựng cả chuỗi CSV rồi encode thêm một bản bytes.
+        """
+        with atomic_open(out, "w", buffering=WRITE_BUFFER_SIZE) as f:
+            writer = csv.writer(f)
+            writer.writerow(self.DEFAULT_FIELDS)
+            writer.writerows(t.to_row() for t in transactions)
+
+    def _write_export(self, out: Path, transactions: List[Transaction]) -> None:
+        """Ghi transactions ra CSV hoặc JSON tùy theo đuôi file."""
+        if out.suffix.lower() == ".json":
+            atomic_write_bytes(out, json_io.dumps([t.to_dict() for t in transactions], indent=True))
+            return
+        self._write_csv(out, transactions)
+
     def _save_transactions(self) -> None:
         """Serialize transactions to CSV and write atomically."""
-        rows = [t.to_dict() for t in self.transactions]
-        buf = io.StringIO()
-        writer = csv.DictWriter(buf, fieldnames=self.DEFAULT_FIELDS)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
-        _atomic_write(self.storage_file, buf.getvalue())
+        self._write_csv(self.storage_file, self.transactions)
 
     def _generate_transaction_id(self) -> str:
         return f"T{uuid.uuid4().hex}"
@@ -128,10 +132,12 @@ class TransactionManager:
             raise ValueError(f"Product '{product_id}' không tồn tại") from exc
 
         delta = qty if trans_type_u == "IMPORT" else -qty
+        # một mốc thời gian cho cả thao tác: last_updated của sản phẩm, ngày giao dịch, dòng log
+        now = datetime.now(VN_TZ)
 
         # apply stock change first
         try:
-            self.product_mgr.apply_stock_change(product_id, delta)
+            self.product_mgr.apply_stock_change(product_id, delta, now=now)
         except Exception:
             logger.exception("Stock change failed for %s (delta=%s)", product_id, delta)
             raise
@@ -141,11 +147,12 @@ class TransactionManager:
             product_id=product_id,
             trans_type=trans_type_u,
             quantity=qty,
+            date=now,
             note=note or ""
         )
 
         self.transactions.append(tx)
-        self.log_transaction(tx)
+        self.log_transaction(tx, logged_at=now)
 
         # persist and rollback on failure
         try:
@@ -158,11 +165,12 @@ class TransactionManager:
                 logger.info("Rollback succeeded for product %s", product_id)
             except Exception:
                 logger.exception("Rollback failed for product %s", product_id)
-            # rollback in-memory
-            try:
-                self.transactions.remove(tx)
-            except ValueError:
-                logger.exception("Failed to remove transaction %s during rollback", tx.transaction_id)
+            # rollback in-memory (tx vừa append nằm ở cuối list → pop O(1))
+            if self.transactions and self.transactions[-1] is tx:
+                self.transactions.pop()
+            else:
+                logger.error("Failed to remove transaction %s during rollback", tx.transaction_id)
+                self.transactions = [t for t in self.transactions if t is not tx]
             raise
 
         return tx
@@ -219,18 +227,7 @@ class TransactionManager:
         """
         Export transactions to CSV or JSON depending on out_path suffix.
         """
-        out = Path(out_path)
-        out.parent.mkdir(parents=True, exist_ok=True)
-        rows = [t.to_dict() for t in self.transactions]
-        if out.suffix.lower() == ".json":
-            _atomic_write(out, json.dumps(rows, ensure_ascii=False, indent=2))
-            return
-        buf = io.StringIO()
-        writer = csv.DictWriter(buf, fieldnames=self.DEFAULT_FIELDS)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
-        _atomic_write(out, buf.getvalue())
+        self._write_export(Path(out_path), self.transactions)
 
     def generate_stock_report(self) -> List[Dict[str, Any]]:
         """Return a simple stock report for all products."""
@@ -242,16 +239,21 @@ class TransactionManager:
                 "stock_quantity": p.stock_quantity,
                 "min_threshold": p.min_threshold,
             }
-            for p in self.product_mgr.list_products()
+            for p in self.product_mgr.products_view()
         ]
-    def log_transaction(self, transaction: Transaction) -> None:
-        """Ghi log chi tiết giao dịch vào file transaction_log.txt."""
+    def log_transaction(self, transaction: Transaction, logged_at: Optional[datetime] = None) -> None:
+        """
+        Ghi log chi tiết giao dịch vào file transaction_log.txt.
+        logged_at: thời điểm ghi log (mặc định: bây giờ); trùng ngày giao dịch thì chỉ format một lần.
+        """
         log_file = self.storage_file.parent / "transaction_log.txt"
-        log_file.parent.mkdir(parents=True, exist_ok=True)
         date_str = transaction.date.isoformat() if transaction.date is not None else ""
-        log_line = f"{datetime.now(VN_TZ).isoformat()} | {transaction.transaction_id} | {transaction.product_id} | {transaction.trans_type} | {transaction.quantity} | {date_str} | {transaction.note}\n"
+        if logged_at is None:
+            logged_at = datetime.now(VN_TZ)
+        logged_str = date_str if logged_at == transaction.date else logged_at.isoformat()
+        log_line = f"{logged_str} | {transaction.transaction_id} | {transaction.product_id} | {transaction.trans_type} | {transaction.quantity} | {date_str} | {transaction.note}\n"
         try:
-            with open(log_file, "a", encoding="utf-8") as f:
+            with open_with_parent_dir(log_file, "a", encoding="utf-8") as f:
                 f.write(log_line)
         except Exception:
             logger.exception("Không thể ghi log giao dịch: %s", transaction.transaction_id)
@@ -270,18 +272,7 @@ class TransactionManager:
                                      date_to: Optional[Any] = None) -> None:
         """Xuất transactions theo filter vào CSV/JSON."""
         filtered = self.filter_transactions(product_id, trans_type, date_from, date_to)
-        out = Path(out_path)
-        out.parent.mkdir(parents=True, exist_ok=True)
-        rows = [t.to_dict() for t in filtered]
-        if out.suffix.lower() == ".json":
-            _atomic_write(out, json.dumps(rows, ensure_ascii=False, indent=2))
-            return
-        buf = io.StringIO()
-        writer = csv.DictWriter(buf, fieldnames=self.DEFAULT_FIELDS)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
-        _atomic_write(out, buf.getvalue())
+        self._write_export(Path(out_path), filtered)
     def get_stock(self, product_id: str) -> Optional[int]:
         """Lấy số lượng tồn kho của một sản phẩm."""
         try:
@@ -293,4 +284,4 @@ class TransactionManager:
 
     def get_all_stock(self) -> Dict[str, int]:
         """Trả về dict {product_id: tồn kho}."""
-        return {p.product_id: p.stock_quantity for p in self.product_mgr.list_products()}
+        return {p.product_id: p.stock_quantity for p in self.product_mgr.products_view()}
@@ -0,0 +1,53 @@
+# src/utils/cat_codec.py
+from __future__ import annotations
+
+import struct
+from typing import Iterable, List
+
+# Định dạng nhị phân cho danh sách tên danh mục:
+#   MAGIC || uint32 count || (uint32 len || utf8 bytes) * count   (little-endian)
+# Không cần thư viện ngoài; nhỏ hơn và encode/decode nhanh hơn JSON indent=2.
+MAGIC = b"MMCAT1"
+SUFFIX = ".bin"
+
+_U32 = struct.Struct("<I")
+
+
+def pack(names: Iterable[str]) -> bytes:
+    """Encode danh sách tên thành bytes theo định dạng length-prefixed."""
+    encoded = [str(n).encode("utf-8") for n in names]
+    parts = [MAGIC, _U32.pack(len(encoded))]
+    for b in encoded:
+        parts.append(_U32.pack(len(b)))
+        parts.append(b)
+    return b"".join(parts)
+
+
+def unpack(data: bytes) -> List[str]:
+    """
+    Decode bytes do pack() tạo ra.
+
+    Raises:
+        ValueError: Nếu sai magic header hoặc dữ liệu bị cắt cụt/hỏng.
+    """
+    view = memoryview(data)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError("File danh mục nhị phân không hợp lệ (sai header)")
+    pos = len(MAGIC)
+    try:
+        (count,) = _U32.unpack_from(view, pos)
+        pos += _U32.size
+        names: List[str] = []
+        for _ in range(count):
+            (length,) = _U32.unpack_from(view, pos)
+            pos += _U32.size
+            end = pos + length
+            if end > len(view):
+                raise ValueError("File danh mục nhị phân bị cắt cụt")
+            names.append(str(view[pos:end], "utf-8"))
+            pos = end
+    except struct.error as exc:
+        raise ValueError(f"File danh mục nhị phân bị hỏng: {exc}") from exc
+    except UnicodeDecodeError as exc:
+        raise ValueError(f"Tên danh mục không phải UTF-8 hợp lệ: {exc}") from exc
+    return names
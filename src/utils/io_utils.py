@@ -1,16 +1,37 @@
 # src/utils/io_utils.py
+from contextlib import contextmanager
 from pathlib import Path
 import tempfile
 import os
-from typing import Union
+from typing import IO, Any, Iterator, Optional, Set, Tuple, Union
 
 PathLike = Union[str, Path]
 
+# thư mục cha đã mkdir trong process này → không gọi lại mkdir (stat) mỗi lần ghi
+_READY_DIRS: Set[str] = set()
+
 
 def atomic_write_text(path: PathLike, text: str, encoding: str = "utf-8") -> None:
     """
     Atomically write `text` to `path`.
 
+    Encodes `text` with `encoding` and delegates to `atomic_write_bytes`.
+
+    Args:
+        path: destination path (str or Path).
+        text: content to write.
+        encoding: text encoding (default "utf-8").
+
+    Raises:
+        OSError (or subclass): Propagates I/O related errors.
+    """
+    atomic_write_bytes(path, text.encode(encoding))
+
+
+def atomic_write_bytes(path: PathLike, data: bytes) -> None:
+    """
+    Atomically write `data` to `path`.
+
     Behavior:
       - Creates parent directories if needed.
       - Writes to a temporary file in the same directory, fsyncs the file,
@@ -19,21 +40,115 @@ def atomic_write_text(path: PathLike, text: str, encoding: str = "utf-8") -> Non
 
     Args:
         path: destination path (str or Path).
-        text: content to write.
-        encoding: text encoding (default "utf-8").
+        data: raw bytes to write.
 
     Raises:
         OSError (or subclass): Propagates I/O related errors.
     """
-    p = Path(path)
-    p.parent.mkdir(parents=True, exist_ok=True)
+    # payload đã có sẵn trong bộ nhớ → ghi thẳng vào fd, không qua lớp buffer của file object
+    target, tmp_path, fd = _mkstemp_beside(path)
+    try:
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            try:
+                os.fsync(fd)
+            except (AttributeError, OSError):
+                pass
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, target)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+
+def ensure_parent_dir(path: PathLike) -> str:
+    """
+    Tạo thư mục cha của `path` nếu cần; mỗi thư mục chỉ mkdir một lần trong process.
+    Cache theo đường dẫn tuyệt đối (không lệch sau os.chdir). Thư mục bị xóa sau khi cache
+    thì caller phải tự tạo lại (xem _recreate_parent_dir, open_with_parent_dir).
+    Trả về đường dẫn tuyệt đối của thư mục cha (str).
+    """
+    parent = os.path.abspath(os.path.dirname(os.fspath(path)) or ".")
+    if parent not in _READY_DIRS:
+        os.makedirs(parent, exist_ok=True)
+        _READY_DIRS.add(parent)
+    return parent
 
+
+def _recreate_parent_dir(path: PathLike) -> str:
+    """Bỏ cache và mkdir lại thư mục cha (dùng khi gặp FileNotFoundError sau ensure_parent_dir)."""
+    parent = os.path.abspath(os.path.dirname(os.fspath(path)) or ".")
+    _READY_DIRS.discard(parent)
+    return ensure_parent_dir(path)
+
+
+def open_with_parent_dir(path: PathLike, mode: str = "a", **kwargs: Any) -> IO[Any]:
+    """
+    `open(path, mode, **kwargs)` cho file ghi không atomic (vd. append log): tạo thư mục cha
+    qua ensure_parent_dir; nếu thư mục đã bị xóa sau khi cache → tạo lại và thử mở thêm một lần.
+    """
+    ensure_parent_dir(path)
+    try:
+        return open(path, mode, **kwargs)
+    except FileNotFoundError:
+        _recreate_parent_dir(path)
+        return open(path, mode, **kwargs)
+
+
+def _mkstemp_beside(path: PathLike) -> Tuple[str, str, int]:
+    """Tạo file tạm (O_EXCL) cùng thư mục với `path`; trả về (target, tmp_path, fd)."""
+    target = os.fspath(path)
+    parent = ensure_parent_dir(target)
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp", dir=parent)
+    except FileNotFoundError:
+        # thư mục bị xóa sau khi cache → tạo lại một lần
+        parent = _recreate_parent_dir(target)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp", dir=parent)
+    return target, tmp_path, fd
+
+
+def _discard(tmp_path: str) -> None:
+    # cleanup temp file on failure; ignore cleanup errors
+    try:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    except OSError:
+        pass
+
+
+@contextmanager
+def atomic_open(path: PathLike, mode: str = "w", *, encoding: Optional[str] = "utf-8",
+                newline: Optional[str] = "", buffering: int = -1) -> Iterator[IO[Any]]:
+    """
+    Mở file tạm cùng thư mục để ghi dạng stream; khi block kết thúc không lỗi thì
+    fsync + `os.replace` sang `path` (người đọc không bao giờ thấy file ghi dở).
+    Nếu block raise, file tạm bị xóa và file đích giữ nguyên.
+
+    Args:
+        path: destination path (str or Path).
+        mode: "w" (text) hoặc "wb" (binary).
+        encoding / newline: chỉ dùng cho text mode.
+        buffering: kích thước buffer của file (như `open`).
+
+    Raises:
+        ValueError: nếu mode không phải "w"/"wb".
+        OSError (or subclass): Propagates I/O related errors.
+    """
+    if mode not in ("w", "wb"):
+        raise ValueError(f"atomic_open chỉ hỗ trợ mode 'w' hoặc 'wb', got {mode!r}")
     # create temp file in same directory to ensure os.replace is atomic on same filesystem
-    fd, tmp_path = tempfile.mkstemp(prefix=".tmp", dir=str(p.parent))
+    target, tmp_path, fd = _mkstemp_beside(path)
     try:
-        # write via fdopen to ensure we control the file descriptor
-        with os.fdopen(fd, "w", encoding=encoding, newline="") as f:
-            f.write(text)
+        if mode == "wb":
+            f = os.fdopen(fd, "wb", buffering=buffering)
+        else:
+            f = os.fdopen(fd, "w", encoding=encoding, newline=newline, buffering=buffering)
+        with f:
+            yield f
             f.flush()
             # ensure data is persisted to disk before rename
             try:
@@ -43,13 +158,8 @@ def atomic_write_text(path: PathLike, text: str, encoding: str = "utf-8") -> Non
                 pass
 
         # atomic replace (overwrite if exists)
-        os.replace(tmp_path, str(p))
-    except OSError:
-        # cleanup temp file on failure; ignore cleanup errors
-        try:
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-        except OSError:
-            pass
-        # re-raise original exception to let caller handle/report it
+        os.replace(tmp_path, target)
+    except BaseException:
+        # cleanup temp file on failure (kể cả lỗi trong block của caller)
+        _discard(tmp_path)
         raise
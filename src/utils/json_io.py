@@ -0,0 +1,87 @@
+# src/utils/json_io.py
+from __future__ import annotations
+
+import json
+import mmap
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+# Optional dependency: orjson (C/Rust) nhanh hơn nhiều so với json chuẩn.
+try:
+    import orjson  # type: ignore[import]
+    _HAS_ORJSON = True
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+    _HAS_ORJSON = False
+
+# orjson.JSONDecodeError là subclass của json.JSONDecodeError nên caller chỉ cần bắt lỗi này.
+JSONDecodeError = json.JSONDecodeError
+
+BytesLike = Union[bytes, bytearray, memoryview, str]
+
+
+def dumps(obj: Any, *, indent: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    Serialize obj thành JSON bytes (UTF-8, không escape ký tự non-ASCII).
+
+    Args:
+        obj: Dữ liệu cần serialize.
+        indent: True → thụt lề 2 khoảng trắng (dễ đọc); False → compact.
+        default: Hàm chuyển đổi cho kiểu không hỗ trợ (vd. Decimal).
+
+    Returns:
+        bytes đã encode UTF-8.
+    """
+    if _HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=default, option=option)
+    if indent:
+        text = json.dumps(obj, ensure_ascii=False, indent=2, default=default)
+    else:
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default)
+    return text.encode("utf-8")
+
+
+def loads(data: BytesLike) -> Any:
+    """
+    Parse JSON từ bytes/str.
+
+    Raises:
+        JSONDecodeError: Nếu dữ liệu không phải JSON hợp lệ.
+    """
+    if _HAS_ORJSON:
+        return orjson.loads(data)
+    if isinstance(data, (bytearray, memoryview)):
+        data = bytes(data)
+    return json.loads(data)
+
+
+def load_path(path: Union[str, Path], hasher: Optional[Any] = None) -> Any:
+    """
+    Đọc + parse file JSON qua mmap (không tạo bản sao str/bytes của cả file khi có orjson).
+
+    Args:
+        path: File cần đọc.
+        hasher: (tùy chọn) object kiểu hashlib; được update() bằng chính vùng mmap,
+            nên có luôn digest của file mà không phải đọc file lần thứ hai.
+
+    Returns:
+        Dữ liệu đã parse, hoặc None nếu file rỗng (mmap không map được file 0 byte).
+
+    Raises:
+        OSError: Nếu không mở được file.
+        JSONDecodeError: Nếu nội dung không phải JSON hợp lệ.
+    """
+    with open(path, "rb") as fh:
+        fh.seek(0, 2)
+        if fh.tell() == 0:
+            return None
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                if hasher is not None:
+                    hasher.update(view)
+                return loads(view)
+            finally:
+                # phải release view trước khi đóng mmap, nếu không mmap.close() báo BufferError
+                view.release()
@@ -2,9 +2,12 @@ from decimal import Decimal, InvalidOperation
 from datetime import datetime
 from typing import Any, Optional
 from src.utils.time_zone import VN_TZ
+from functools import lru_cache
 import unicodedata
 import re
 
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9\s]")
+
 def normalize_name(name: Any, ascii_only: bool = False) -> str:
     """
     Chuẩn hóa chuỗi để so sánh/tìm kiếm.
@@ -13,15 +16,21 @@ def normalize_name(name: Any, ascii_only: bool = False) -> str:
     """
     if name is None:
         return ""
+    return _normalize_str(str(name), ascii_only)
+
 
-    s = " ".join(str(name).strip().lower().split())  # loại bỏ khoảng trắng thừa
+@lru_cache(maxsize=8192)
+def _normalize_str(name: str, ascii_only: bool) -> str:
+    # Cache theo chuỗi gốc: tên danh mục/sản phẩm lặp lại rất nhiều lần
+    s = " ".join(name.strip().lower().split())  # loại bỏ khoảng trắng thừa
 
     if ascii_only:
-        # Loại bỏ dấu tiếng Việt bằng Unicode normalization
-        nfkd = unicodedata.normalize("NFKD", s)
-        s = "".join([c for c in nfkd if not unicodedata.combining(c)])
+        if not s.isascii():
+            # Loại bỏ dấu tiếng Việt bằng Unicode normalization
+            nfkd = unicodedata.normalize("NFKD", s)
+            s = "".join([c for c in nfkd if not unicodedata.combining(c)])
         # Giữ lại chữ, số, khoảng trắng
-        s = re.sub(r"[^a-z0-9\s]", "", s)
+        s = _NON_ALNUM_RE.sub("", s)
 
     return s
 
@@ -39,14 +48,23 @@ def to_decimal(value: Any) -> Decimal:
         ValueError: Nếu không thể chuyển về Decimal.
     """
     try:
-        if isinstance(value, Decimal):
+        # so type chính xác (không đi MRO như isinstance) cho hai kiểu thường gặp nhất
+        if type(value) is Decimal:
             return value
-        s = str(value).strip().replace(",", ".")
-        return Decimal(s)
+        # int (không phải bool) → Decimal trực tiếp, bỏ qua bước format/parse chuỗi
+        if type(value) is int:
+            return Decimal(value)
+        return _to_decimal_str(value if isinstance(value, str) else str(value))
     except (InvalidOperation, ValueError, TypeError):
         raise ValueError(f"Giá trị không hợp lệ cho Decimal: {value!r}")
 
 
+@lru_cache(maxsize=16384)
+def _to_decimal_str(s: str) -> Decimal:
+    # Decimal là immutable; giá trong file dữ liệu lặp lại nhiều nên cache theo chuỗi gốc
+    return Decimal(s.strip().replace(",", "."))
+
+
 def parse_iso_datetime(value: Optional[Any], default_now: bool = False) -> Optional[datetime]:
     """
     Parse ISO datetime thành datetime object timezone-aware (UTC).
@@ -72,14 +90,20 @@ def parse_iso_datetime(value: Optional[Any], default_now: bool = False) -> Optio
         return value if value.tzinfo else value.replace(tzinfo=VN_TZ)
 
     try:
-        parsed = datetime.fromisoformat(str(value))
-        return parsed if parsed.tzinfo else parsed.replace(tzinfo=VN_TZ)
+        return _parse_iso_cached(value if isinstance(value, str) else str(value))
     except Exception:
         if default_now:
             return datetime.now(VN_TZ)
         raise ValueError(f"Invalid datetime format: {value!r}")
 
 
+@lru_cache(maxsize=65536)
+def _parse_iso_cached(s: str) -> datetime:
+    # datetime là immutable nên dùng chung kết quả được; file dữ liệu thường lặp lại nhiều timestamp
+    parsed = datetime.fromisoformat(s)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=VN_TZ)
+
+
 def ensure_int(value: Any, must_be_positive: bool = False) -> int:
     """
     Ép value về int.
@@ -94,10 +118,14 @@ def ensure_int(value: Any, must_be_positive: bool = False) -> int:
     Raises:
         ValueError: Nếu không thể chuyển hoặc không thỏa điều kiện.
     """
-    try:
-        n = int(str(value).strip())
-    except (TypeError, ValueError):
-        raise ValueError(f"Trường số phải là số nguyên hợp lệ: {value!r}")
+    if type(value) is int:
+        # fast path: đã là int (không phải bool) → bỏ qua str()/strip()/parse
+        n = value
+    else:
+        try:
+            n = int(str(value).strip())
+        except (TypeError, ValueError):
+            raise ValueError(f"Trường số phải là số nguyên hợp lệ: {value!r}")
 
     if must_be_positive and n <= 0:
         raise ValueError(f"Giá trị phải >0, got {n}")
@@ -117,3 +117,137 @@ def test_export_low_stock_report(sample_setup, tmp_path):
 
     # Kiểm tra alerts trả về
     assert len(alerts) > 0, "Không có cảnh báo được trả về từ báo cáo"
+
+
+def test_export_low_stock_xlsx_sheets(sample_setup, tmp_path):
+    pm, tm = sample_setup
+    openpyxl = pytest.importorskip("openpyxl")
+
+    xlsx_path = tmp_path / "exports" / "low_stock.xlsx"
+    alerts = report.generate_low_stock_alerts(pm, transaction_mgr=tm)
+    report.export_alerts_xlsx(alerts, str(xlsx_path))
+
+    wb = openpyxl.load_workbook(xlsx_path, read_only=True)
+    assert wb.sheetnames == ["OutOfStock", "LowStock", "ByCategory"]
+    rows = list(wb["LowStock"].iter_rows(values_only=True))
+    assert rows[0][0] == "product_id"
+    assert rows[1][0] == "SP01"
+    wb.close()
+
+
+def test_export_transactions_csv_roundtrip(sample_setup, tmp_path):
+    pm, tm = sample_setup
+    csv_path = tmp_path / "exports" / "transactions.csv"
+    tm.export_transactions(csv_path)
+
+    reloaded = TransactionManager(csv_path, pm)
+    assert [t.to_dict() for t in reloaded.transactions] == [t.to_dict() for t in tm.transactions]
+
+
+def test_export_transaction_log_csv(sample_setup, tmp_path):
+    pm, tm = sample_setup
+    out = tmp_path / "log"
+    report.export_transaction_log(
+        tm,
+        out_txt_path=str(out / "log.txt"),
+        out_csv_path=str(out / "log.csv"),
+        out_json_path=str(out / "log.json"),
+        out_xlsx_path=None,
+    )
+
+    lines = (out / "log.csv").read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "transaction_id,product_id,trans_type,quantity,date,note"
+    assert len(lines) == 1 + len(tm.transactions)
+    assert "SP01" in lines[1]
+    assert (out / "log.txt").exists()
+    import json
+    logged = json.loads((out / "log.json").read_text(encoding="utf-8"))
+    assert [r["transaction_id"] for r in logged] == [t.transaction_id for t in tm.transactions]
+
+
+def test_logs_survive_removed_directory(sample_setup, tmp_path):
+    import shutil
+    pm, tm = sample_setup
+    log_file = tm.storage_file.parent / "transaction_log.txt"
+    tm.log_transaction(tm.transactions[0])
+    shutil.rmtree(tm.storage_file.parent)
+    tm.log_transaction(tm.transactions[0])
+    # thư mục (và log cũ) đã bị xóa → log được ghi lại vào thư mục tạo mới
+    assert log_file.read_text(encoding="utf-8").count(tm.transactions[0].transaction_id) == 1
+
+    out = tmp_path / "report"
+    for _ in range(2):
+        report.export_transaction_log(tm, out_txt_path=str(out / "log.txt"), out_csv_path=str(out / "log.csv"),
+                                      out_json_path=str(out / "log.json"), out_xlsx_path=None)
+        assert (out / "log.json").exists()
+        shutil.rmtree(out)
+
+
+def test_load_transactions_legacy_header(sample_setup, tmp_path):
+    pm, _ = sample_setup
+    csv_path = tmp_path / "legacy.csv"
+    csv_path.write_text(
+        "product,type,qty,created_at\n"
+        "SP01,export,2,2025-01-02T03:04:05+07:00\n"
+        "\n"
+        "SP01,import,0,\n",  # quantity 0 → bỏ qua dòng
+        encoding="utf-8",
+    )
+    reloaded = TransactionManager(csv_path, pm)
+    assert [(t.product_id, t.trans_type, t.quantity) for t in reloaded.transactions] == [("SP01", "EXPORT", 2)]
+    assert reloaded.transactions[0].date.year == 2025
+
+
+def test_load_transactions_regenerates_duplicate_ids(sample_setup, tmp_path):
+    pm, tm = sample_setup
+    csv_path = tmp_path / "dup.csv"
+    tm.transactions = tm.transactions * 3  # cùng một transaction_id lặp 3 lần
+    tm.export_transactions(csv_path)
+
+    reloaded = TransactionManager(csv_path, pm)
+    ids = [t.transaction_id for t in reloaded.transactions]
+    assert len(ids) == 3 and len(set(ids)) == 3
+    assert ids[0] == tm.transactions[0].transaction_id
+
+
+def test_add_transaction_rolls_back_on_save_error(sample_setup, monkeypatch):
+    pm, tm = sample_setup
+    before = tm.list_transactions()
+    stock = pm.get_product("SP01").stock_quantity
+
+    def fail():
+        raise OSError("disk full")
+
+    monkeypatch.setattr(tm, "_save_transactions", fail)
+    with pytest.raises(OSError):
+        tm.add_transaction("SP01", "IMPORT", 4)
+    assert tm.list_transactions() == before
+    assert pm.get_product("SP01").stock_quantity == stock
+
+
+def test_low_stock_csv_columns(tmp_path):
+    import csv
+
+    alerts = {
+        "out_of_stock": [{"product_id": "SP09", "name": "Nước", "stock_quantity": 0, "needed": None}],
+        "low_stock": [{"product_id": "SP10", "name": "Bia", "stock_quantity": 2, "unit": "lon"}],
+    }
+    out = tmp_path / "alerts.csv"
+    report.write_low_stock_alerts(alerts, out_txt_path=None, out_csv_path=str(out))
+    with out.open(encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == list(report.LOW_STOCK_CSV_FIELDS)
+    assert [(r["product_id"], r["type"], r["needed"], r["unit"]) for r in rows] == [
+        ("SP09", "OUT_OF_STOCK", "", ""),
+        ("SP10", "LOW_STOCK", "", "lon"),
+    ]
+
+
+def test_add_transaction_uses_one_timestamp(sample_setup):
+    pm, tm = sample_setup
+    tx = tm.add_transaction("SP01", "IMPORT", 2)
+    assert pm.get_product("SP01").last_updated == tx.date
+    log_line = (tm.storage_file.parent / "transaction_log.txt").read_text(encoding="utf-8").splitlines()[-1]
+    parts = log_line.split(" | ")
+    assert parts[1] == tx.transaction_id
+    assert parts[0] == parts[5] == tx.date.isoformat()
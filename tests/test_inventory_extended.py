@@ -61,6 +61,25 @@ def test_rename_category_collision(tmp_path):
         cat_mgr.rename_category("Thực phẩm", "Đồ uống")
 
 
+def test_category_file_parsed_once_until_changed(tmp_path, monkeypatch):
+    from src.inventory.category_manager import CategoryManager
+    path = tmp_path / "categories.json"
+    path.write_text('["Thực phẩm"]', encoding="utf-8")
+    assert CategoryManager(storage_path=path).get_all_names() == ["Thực phẩm"]
+
+    calls = []
+    orig = CategoryManager._load_json_names
+    monkeypatch.setattr(CategoryManager, "_load_json_names", staticmethod(lambda p: (calls.append(p), orig(p))[1]))
+    cm = CategoryManager(storage_path=path)
+    assert cm.get_all_names() == ["Thực phẩm"] and calls == []
+    cm.add_category("Đồ uống")  # save cập nhật cache → vẫn không parse lại
+    assert CategoryManager(storage_path=path).get_all_names() == ["Thực phẩm", "Đồ uống"] and calls == []
+
+    path.write_text('["Gia dụng", "Điện tử", "Khác"]', encoding="utf-8")  # sửa từ bên ngoài
+    assert CategoryManager(storage_path=path).get_all_names() == ["Gia dụng", "Điện tử", "Khác"]
+    assert len(calls) == 1
+
+
 def test_add_category_empty_name(tmp_path):
     from src.inventory.category_manager import CategoryManager
     cat_mgr = CategoryManager(storage_path=tmp_path / "categories.json")
@@ -81,3 +100,230 @@ def test_io_error_on_save(monkeypatch, tmp_path):
     monkeypatch.setattr(cat_mgr, "save", fail_write)
     with pytest.raises(IOError):
         cat_mgr.add_category("Đồ chơi")
+
+
+def test_remove_and_rename_category_keep_index_in_sync(tmp_path):
+    from src.inventory.category_manager import CategoryManager
+    cat_mgr = CategoryManager(storage_path=tmp_path / "categories.json")
+    for n in ["Thực phẩm", "Đồ uống", "Gia dụng"]:
+        cat_mgr.add_category(n)
+
+    assert cat_mgr.remove_category("THỰC PHẨM")
+    assert not cat_mgr.remove_category("Thực phẩm")
+    cat_mgr.rename_category("gia dụng", "Điện tử")
+
+    assert cat_mgr.get_all_names() == ["Đồ uống", "Điện tử"]
+    assert cat_mgr.is_valid_name("điện tử")
+    assert not cat_mgr.is_valid_name("Gia dụng")
+    assert cat_mgr.remove_category("Điện tử")
+    assert cat_mgr.get_all_names() == ["Đồ uống"]
+
+
+def test_product_default_timestamps_share_one_clock_read():
+    p = Product("SP900", "Muối", "Thực phẩm", 1000, 2000, 1, 1, "gói")
+    assert p.created_date is not None and p.created_date.tzinfo is not None
+    assert p.created_date == p.last_updated
+
+
+def test_category_batch_writes_once(tmp_path, monkeypatch):
+    from src.inventory import category_manager as cm_module
+    path = tmp_path / "categories.json"
+    cat_mgr = cm_module.CategoryManager(storage_path=path)
+
+    writes = []
+    original = cm_module.atomic_write_bytes
+    monkeypatch.setattr(cm_module, "atomic_write_bytes", lambda *a: (writes.append(a[0]), original(*a)))
+
+    with cat_mgr.batch():
+        cat_mgr.add_category("Thực phẩm")
+        with cat_mgr.batch():
+            cat_mgr.add_category("Đồ uống")
+        cat_mgr.rename_category("Đồ uống", "Nước giải khát")
+        assert writes == []
+
+    assert len(writes) == 1
+    assert cm_module.CategoryManager(storage_path=path).get_all_names() == ["Thực phẩm", "Nước giải khát"]
+
+
+def test_category_binary_storage_migrates_from_json(tmp_path):
+    from src.inventory.category_manager import CategoryManager
+    from src.utils import cat_codec
+
+    CategoryManager(storage_path=tmp_path / "categories.json").add_category("Thực phẩm")
+
+    bin_path = tmp_path / "categories.bin"
+    cat_mgr = CategoryManager(storage_path=bin_path)
+    assert cat_mgr.get_all_names() == ["Thực phẩm"]
+    assert not bin_path.exists()
+
+    cat_mgr.add_category("Đồ uống")
+    assert cat_codec.unpack(bin_path.read_bytes()) == ["Thực phẩm", "Đồ uống"]
+    assert CategoryManager(storage_path=bin_path).get_all_names() == ["Thực phẩm", "Đồ uống"]
+
+    with pytest.raises(ValueError):
+        cat_codec.unpack(cat_codec.pack(["Đồ uống"])[:-2])
+
+
+def test_product_uses_slots():
+    p = Product("SP901", "Muối", "Thực phẩm", 1000, 2000, 1, 1, "gói")
+    assert not hasattr(p, "__dict__")
+    with pytest.raises(AttributeError):
+        p.khong_ton_tai = 1
+    assert Product.from_dict(p.to_dict()) == p
+
+
+def test_product_from_csv_rows_shares_batch_clock():
+    rows = [
+        {"product_id": "SP910", "name": "Muối", "cost_price": "1000", "sell_price": "2000",
+         "stock_quantity": "3", "created_date": "", "last_updated": ""},
+        {"product_id": "SP911", "name": "Đường", "cost_price": "", "sell_price": "",
+         "created_date": "2025-01-02T03:04:05+07:00", "last_updated": ""},
+    ]
+    a, b = Product.from_csv_rows(rows)
+    assert a.created_date == a.last_updated == b.last_updated
+    assert b.created_date.isoformat() == "2025-01-02T03:04:05+07:00"
+    assert (a.stock_quantity, b.cost_price) == (3, 0)
+
+
+def test_product_to_row_matches_to_dict():
+    from src.inventory.product_manager import ProductManager
+
+    p = Product("SP920", "Muối", "Thực phẩm", "1000.5", 2000, 1, 1, "gói")
+    d = p.to_dict()
+    assert p.to_row() == tuple(d[k] for k in ProductManager.DEFAULT_FIELDS)
+
+
+def test_product_to_dict_cache_invalidated_by_mutators():
+    p = Product("SP921", "Muối", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    d = p.to_dict()
+    d["name"] = "sửa bản sao"
+    assert p.to_dict()["name"] == "Muối"
+
+    p.adjust_stock(-2)
+    assert p.to_dict()["stock_quantity"] == 3
+    p.update_prices(sell_price=2500)
+    assert p.to_dict()["sell_price"] == "2500"
+
+
+def test_product_stock_status_labels():
+    def status(qty, thr):
+        return Product("SP930", "Muối", "Thực phẩm", 1000, 2000, qty, thr, "gói").stock_status()
+
+    assert status(0, 0) == "🚨 Hết hàng"
+    assert status(0, 5) == "🚨 Hết hàng"
+    assert status(5, 5) == "⚠️ Sắp hết"
+    assert status(6, 5) == "Bình thường"
+
+
+def test_product_from_trusted_dict_matches_from_dict():
+    p = Product("SP940", "Muối", "Thực phẩm", "1000.5", 2000, 3, 1, "gói")
+    d = p.to_dict()
+    trusted = Product.from_trusted_dict(d)
+    assert trusted == Product.from_dict(d) == p
+    assert trusted.to_dict() == d
+
+    # sai kiểu → fallback from_dict (có validate)
+    bad = dict(d, stock_quantity="-1")
+    with pytest.raises(ValueError):
+        Product.from_trusted_dict(bad)
+
+
+def test_product_from_trusted_dict_missing_price_uses_default():
+    d = Product("SP941", "Muối", "Thực phẩm", 0, 2000, 3, 1, "gói").to_dict()
+    del d["cost_price"]
+    p = Product.from_trusted_dict(d)
+    assert p.cost_price == 0 and p.sell_price == 2000
+
+
+@pytest.mark.parametrize("changes", [
+    {"stock_quantity": -5},
+    {"min_threshold": -1},
+    {"cost_price": "-1"},
+    {"sell_price": "500"},  # giá bán < giá nhập
+    {"sell_price": "NaN"},
+    {"created_date": "not-a-date"},
+    {"last_updated": "not-a-date"},
+])
+def test_product_from_trusted_dict_out_of_range_rejected(changes):
+    d = dict(Product("SP942", "Muối", "Thực phẩm", 1000, 2000, 3, 1, "gói").to_dict(), **changes)
+    with pytest.raises((ValueError, ArithmeticError)):
+        Product.from_trusted_dict(d)
+
+
+def test_product_iter_csv_streams_rows(tmp_path):
+    f = tmp_path / "products.csv"
+    f.write_text(
+        "product_id,name,category,cost_price,sell_price,stock_quantity\n"
+        "SP950,Muối,Thực phẩm,1000,2000,3\n"
+        ",Thiếu mã,Thực phẩm,1,1,1\n",
+        encoding="utf-8",
+    )
+    it = Product.iter_csv(f)
+    first = next(it)
+    assert (first.product_id, first.stock_quantity) == ("SP950", 3)
+    with pytest.raises(ValueError):
+        next(it)
+
+
+def test_product_parallel_from_csv_keeps_order(tmp_path):
+    f = tmp_path / "products.csv"
+    lines = ["product_id,name,category,cost_price,sell_price,stock_quantity,min_threshold,unit"]
+    lines += [f"SP{i:04d},Hàng {i},Thực phẩm,{i},{i + 1},{i % 7},2,gói" for i in range(25)]
+    f.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    expected = [p.to_row()[:8] for p in Product.iter_csv(f)]
+    parallel = Product.parallel_from_csv(f, n_workers=2, chunksize=10)
+    assert [p.to_row()[:8] for p in parallel] == expected
+    assert len(Product.parallel_from_csv(f, chunksize=100)) == 25
+
+
+def test_product_parallel_encode_fills_caches():
+    products = [Product(f"SP{i:04d}", f"Hàng, {i}", "Thực phẩm", i, i + 1, i, 1, "gói") for i in range(25)]
+    expected = [(p.to_json_bytes(), p.to_csv_line()) for p in Product.from_field_tuples(p.to_row() for p in products)]
+    assert Product.parallel_encode(products, chunksize=100) == 0
+    assert Product.parallel_encode(products, n_workers=2, chunksize=10) == 25
+    assert [(p._json, p._csv_line) for p in products] == expected
+    # cache đã đủ → không encode lại
+    assert Product.parallel_encode(products, chunksize=10) == 0
+
+
+def test_product_profit_margin_cached_until_price_change():
+    p = Product("SP960", "Muối", "Thực phẩm", 1000, 1500, 1, 1, "gói")
+    assert p.profit_margin_percent() == 50.0
+    p.update_prices(sell_price=2000)
+    assert p.profit_margin_percent() == 100.0
+    assert Product("SP961", "Tặng", "Thực phẩm", 0, 0, 1, 1, "gói").profit_margin_percent() == 0.0
+    q = Product("SP962", "Đường", "Thực phẩm", "12345.67", "15000.5", 1, 1, "kg")
+    assert q.profit_margin_percent() == float((q.sell_price - q.cost_price) / q.cost_price * 100)
+
+
+def test_product_to_csv_line_matches_csv_writer():
+    import csv
+    import io
+
+    p = Product("SP970", 'Bánh "ngon", loại 1\nmới', "Thực phẩm", "1000.5", 2000, 1, 1, "gói")
+    buf = io.StringIO()
+    csv.writer(buf).writerow(p.to_row())
+    assert p.to_csv_line() == buf.getvalue()
+    row = next(csv.reader(io.StringIO(p.to_csv_line())))
+    assert row[1] == p.name
+
+
+def test_product_to_csv_line_cache_invalidated():
+    p = Product("SP971", "Muối", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    line = p.to_csv_line()
+    assert p.to_csv_line() is line
+    p.adjust_stock(1)
+    assert ",6,1," in p.to_csv_line()
+
+
+def test_product_to_json_bytes_cached_and_compact():
+    from src.utils import json_io
+
+    a = Product("SP972", "Đường", "Thực phẩm", 1000, 2000, 5, 1, "kg")
+    b = Product("SP973", 'Bột "mì"', "Thực phẩm", 1000, 2000, 5, 1, "kg")
+    raw = a.to_json_bytes()
+    assert a.to_json_bytes() is raw
+    assert b"[" + b",".join([a.to_json_bytes(), b.to_json_bytes()]) + b"]" == json_io.dumps([a.to_dict(), b.to_dict()])
+    a.update_prices(sell_price=2500)
+    assert json_io.loads(a.to_json_bytes())["sell_price"] == "2500"
@@ -84,3 +84,625 @@ def test_save_creates_file(tmp_path, temp_category_manager):
     assert file_path.exists()
     data = json.loads(file_path.read_text(encoding="utf-8"))
     assert "Đặc sản" in data
+
+
+def test_search_and_lookup_follow_updates(temp_product_manager):
+    pm = temp_product_manager
+    pm.add_product("SP105", "Bánh quy", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    assert [p.product_id for p in pm.search_products("bánh")] == ["SP105"]
+
+    pm.update_product("SP105", name="Kẹo dẻo")
+    assert not pm.search_products("bánh")
+    assert [p.product_id for p in pm.search_products("kẹo")] == ["SP105"]
+    assert pm.get_product("SP105").name == "Kẹo dẻo"
+
+    pm.products = []
+    with pytest.raises(ValueError):
+        pm.get_product("SP105")
+
+
+def test_batch_saves_once(temp_product_manager, monkeypatch):
+    pm = temp_product_manager
+    calls = []
+    original = pm._save_products
+    monkeypatch.setattr(pm, "_save_products", lambda: (calls.append(1), original()))
+
+    with pm.batch():
+        pm.add_product("SP107", "Chuối", "Thực phẩm", 1000, 2000, 5, 1, "kg")
+        pm.add_product("SP108", "Nho", "Thực phẩm", 3000, 5000, 5, 1, "kg")
+        pm.apply_stock_change("SP107", 3)
+        assert calls == []
+
+    assert calls == [1]
+    data = json.loads(pm.storage_file.read_text(encoding="utf-8"))
+    assert [d["product_id"] for d in data] == ["SP107", "SP108"]
+    assert data[0]["stock_quantity"] == 8
+
+
+def test_load_csv_reordered_header_and_blank_cells(tmp_path):
+    from src.inventory.category_manager import CategoryManager
+    from src.inventory.product_manager import ProductManager
+
+    csv_file = tmp_path / "products.csv"
+    csv_file.write_text(
+        "name,product_id,category,sell_price,cost_price,stock_quantity,unit\n"
+        "Táo,SP301,Thực phẩm,2000,1000,7,kg\n"
+        "\n"
+        "Muối,SP302,Gia vị,,,,\n",
+        encoding="utf-8",
+    )
+    pm = ProductManager(csv_file, category_mgr=CategoryManager(tmp_path / "categories.json"))
+
+    assert [p.product_id for p in pm.products] == ["SP301", "SP302"]
+    tao = pm.get_product("SP301")
+    assert (tao.name, str(tao.cost_price), str(tao.sell_price), tao.stock_quantity) == ("Táo", "1000", "2000", 7)
+    muoi = pm.get_product("SP302")
+    assert (muoi.stock_quantity, muoi.min_threshold, muoi.unit) == (0, 0, "")
+    assert muoi.created_date is not None
+
+
+def test_product_batch_frame_matches_manager(temp_product_manager, tmp_path):
+    pd = pytest.importorskip("pandas")
+    from src.inventory import product_batch
+
+    pm = temp_product_manager
+    pm.add_product("SP401", "Táo", "Thực phẩm", 1000, 1500, 0, 2, "kg")
+    pm.add_product("SP402", "Cam", "Thực phẩm", 2000, 3000, 2, 2, "kg")
+    pm.add_product("SP403", "Lê", "Thực phẩm", 0, 3000, 9, 2, "kg")
+
+    csv_path = tmp_path / "products.csv"
+    pm.export_csv(csv_path)
+    for df in (product_batch.load_products_frame(csv_path),
+               product_batch.load_products_frame(pm.storage_file),
+               product_batch.products_to_frame(pm.list_products())):
+        df = df[df["product_id"].str.startswith("SP40")].reset_index(drop=True)
+        assert df["stock_quantity"].dtype == "int64"
+        assert list(product_batch.stock_status(df)) == ["🚨 Hết hàng", "⚠️ Sắp hết", "Bình thường"]
+        assert list(product_batch.margin_percent(df)) == [50.0, 50.0, 0.0]
+
+
+def test_export_import_json_roundtrip(temp_product_manager, tmp_path):
+    pm = temp_product_manager
+    pm.add_product("SP501", "Nước mắm", "Thực phẩm", "15000.50", 20000, 4, 1, "chai")
+    out = tmp_path / "export" / "products.json"
+    pm.export_json(out)
+
+    text = out.read_text(encoding="utf-8")
+    assert "Nước mắm" in text  # không escape ký tự tiếng Việt
+    before = [p.to_dict() for p in pm.products]
+    pm.products = []
+    pm.import_json(out)
+    assert [p.to_dict() for p in pm.products] == before
+
+
+def test_id_index_follows_delete_in_middle(temp_product_manager):
+    pm = temp_product_manager
+    pm.products = []
+    for i in range(4):
+        pm.add_product(f"SP60{i}", f"Hàng {i}", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+
+    pm.delete_product("SP601")
+    assert [p.product_id for p in pm.list_products()] == ["SP600", "SP602", "SP603"]
+    assert pm.get_product("SP603").name == "Hàng 3"
+    pm.update_product("SP602", name="Đổi tên")
+    assert pm.products[1].name == "Đổi tên"
+    with pytest.raises(ValueError):
+        pm.add_product("SP603", "Trùng", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+
+
+def test_flush_inside_batch(temp_product_manager, monkeypatch):
+    pm = temp_product_manager
+    calls = []
+    original = pm._save_products
+    monkeypatch.setattr(pm, "_save_products", lambda: (calls.append(1), original()))
+
+    pm.flush()
+    assert calls == []
+    with pm.batch():
+        pm.add_product("SP701", "Gạo", "Thực phẩm", 1000, 2000, 5, 1, "kg")
+        pm.flush()
+        assert calls == [1]
+        assert "SP701" in pm.storage_file.read_text(encoding="utf-8")
+    assert calls == [1]
+
+
+def test_export_json_streams_valid_json(temp_product_manager, tmp_path):
+    pm = temp_product_manager
+    out = tmp_path / "empty.json"
+    pm.products = []
+    pm.export_json(out)
+    assert json.loads(out.read_text(encoding="utf-8")) == []
+
+    pm.add_product("SP801", "Bột giặt", "Gia dụng", 30000, 45000, 3, 1, "túi")
+    pm.add_product("SP802", "Nước rửa chén", "Gia dụng", 20000, 30000, 3, 1, "chai")
+    pm.export_json(out)
+    assert json.loads(out.read_text(encoding="utf-8")) == [p.to_dict() for p in pm.products]
+    assert not [f for f in tmp_path.iterdir() if f.name.startswith(".tmp")]
+
+
+def test_storage_json_compact_and_pretty_export(temp_product_manager, tmp_path):
+    pm = temp_product_manager
+    pm.add_product("SP811", "Xà phòng", "Gia dụng", 10000, 15000, 3, 1, "bánh")
+    stored = pm.storage_file.read_text(encoding="utf-8")
+    assert "\n" not in stored.strip() and '"SP811"' in stored
+
+    out = tmp_path / "pretty.json"
+    pm.export_json(out, pretty=True)
+    text = out.read_text(encoding="utf-8")
+    assert '\n  {\n    "product_id"' in text
+    assert json.loads(text) == [p.to_dict() for p in pm.products]
+
+
+def test_search_index_incremental_and_exact(temp_product_manager):
+    pm = temp_product_manager
+    pm.add_product("SP301", "Sữa tươi", "Thực phẩm", 1000, 2000, 5, 1, "hộp")
+    assert [p.product_id for p in pm.search_products("sữa tươi", exact=True)] == ["SP301"]
+    # index đã build → các thao tác sau cập nhật tăng dần
+    pm.add_product("SP302", "Sữa chua", "Thực phẩm", 1000, 2000, 5, 1, "hộp")
+    pm.update_product("SP301", name="Sữa đặc")
+    assert not pm.search_products("sữa tươi", exact=True)
+    assert {p.product_id for p in pm.search_products("sữa")} == {"SP301", "SP302"}
+    pm.delete_product("SP301")
+    assert [p.product_id for p in pm.search_products("SỮA")] == ["SP302"]
+    assert not pm.search_products("sữa đặc", exact=True)
+    assert [p.name for p in pm.search_products("sp302", field="product_id", exact=True)] == ["Sữa chua"]
+
+
+def test_search_results_cached_until_catalog_changes(temp_product_manager, monkeypatch):
+    import src.inventory.product_manager as pm_module
+    pm = temp_product_manager
+    pm.add_product("SP303", "Trà xanh", "Thực phẩm", 1000, 2000, 5, 1, "chai")
+    first = pm.search_products("trà")
+    first.clear()  # sửa list trả về không làm hỏng cache
+    pm._search_index = {f: {} for f in pm.ALLOWED_SEARCH_FIELDS}  # cache hit thì không đọc index
+    assert [p.product_id for p in pm.search_products(" TRÀ ")] == ["SP303"]
+
+    pm._search_index = None
+    pm.add_product("SP304", "Trà đào", "Thực phẩm", 1000, 2000, 5, 1, "chai")
+    assert [p.product_id for p in pm.search_products("trà")] == ["SP303", "SP304"]
+
+    monkeypatch.setattr(pm_module, "SEARCH_CACHE_SIZE", 1)
+    pm.search_products("đào")
+    assert list(pm._search_cache) == [("name", "đào", False)]
+
+
+def test_import_json_saves_once(temp_product_manager, tmp_path, monkeypatch):
+    pm = temp_product_manager
+    pm.add_product("SP311", "Bánh mì", "Thực phẩm", 1000, 2000, 5, 1, "cái")
+    pm.add_product("SP312", "Bánh bao", "Thực phẩm", 1000, 2000, 5, 1, "cái")
+    out = tmp_path / "dump.json"
+    pm.export_json(out)
+
+    calls = []
+    monkeypatch.setattr(pm, "_save_products", lambda: calls.append(1))
+    pm.import_json(out)
+    assert len(calls) == 1
+    assert [p.product_id for p in pm.products] == ["SP311", "SP312"]
+
+    empty = tmp_path / "empty.json"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError):
+        pm.import_json(empty)
+    assert len(pm.products) == 2
+
+
+def test_products_keyed_by_id_keep_order_on_update(temp_product_manager):
+    pm = temp_product_manager
+    pm.products = []
+    for pid in ("SP321", "SP322", "SP323"):
+        pm.add_product(pid, "Kẹo " + pid, "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    with pytest.raises(ValueError):
+        pm.add_product("SP322", "Trùng", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    pm.update_product("SP322", name="Kẹo dẻo")
+    assert [p.product_id for p in pm.list_products()] == ["SP321", "SP322", "SP323"]
+    assert [p.product_id for p in pm.search_products("kẹo dẻo", exact=True)] == ["SP322"]
+    pm.delete_product("SP321")
+    with pytest.raises(ValueError):
+        pm.get_product("SP321")
+    # products trả về bản sao: sửa list không ảnh hưởng manager
+    pm.products.clear()
+    assert len(pm.products) == 2
+
+
+def test_add_product_single_timestamp(temp_product_manager):
+    pm = temp_product_manager
+    p = pm.add_product("SP331", "Muối", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    assert p.created_date == p.last_updated
+    updated = pm.apply_stock_change("SP331", 3)
+    assert updated.stock_quantity == 8
+    assert updated.last_updated >= p.last_updated
+
+
+@pytest.mark.parametrize("suffix", [".json", ".csv"])
+def test_save_skips_unchanged_payload(tmp_path, temp_category_manager, monkeypatch, suffix):
+    import src.inventory.product_manager as pm_module
+    from src.inventory.product_manager import ProductManager
+
+    temp_category_manager.add_category("Gia vị")
+    pm = ProductManager(storage_file=tmp_path / f"products{suffix}", category_mgr=temp_category_manager)
+    pm.add_product("SP341", "Tiêu", "Gia vị", 1000, 2000, 5, 1, "gói")
+
+    writes = []
+    real_bytes, real_open = pm_module.atomic_write_bytes, pm_module.atomic_open
+    monkeypatch.setattr(pm_module, "atomic_write_bytes", lambda *a, **k: (writes.append(1), real_bytes(*a, **k)))
+    monkeypatch.setattr(pm_module, "atomic_open", lambda *a, **k: (writes.append(1), real_open(*a, **k))[1])
+
+    pm._save_products()
+    assert writes == []
+    # manager mới đọc lại file → hash khởi tạo từ đĩa
+    pm2 = ProductManager(storage_file=tmp_path / f"products{suffix}", category_mgr=temp_category_manager)
+    pm2._save_products()
+    assert writes == []
+    pm2.apply_stock_change("SP341", 1)
+    assert writes == [1]
+    (tmp_path / f"products{suffix}").unlink()
+    pm2._save_products()
+    assert writes == [1, 1]
+
+
+def test_import_csv_validate_categories(temp_product_manager, tmp_path):
+    pm = temp_product_manager
+    cat_mgr = pm.category_mgr
+    snap = cat_mgr.valid_name_set_normalized()
+    assert snap is cat_mgr.valid_name_set_normalized()
+
+    pm.add_product("SP351", "Nước mắm", "Thực phẩm", 1000, 2000, 5, 1, "chai")
+    out = tmp_path / "p.csv"
+    pm.export_csv(out)
+    out.write_text(out.read_text(encoding="utf-8").replace("Thực phẩm", "Hải sản"), encoding="utf-8")
+
+    with pytest.raises(ValueError, match="Hải sản"):
+        pm.import_csv(out, validate_categories=True)
+    assert pm.get_product("SP351").category == "Thực phẩm"
+
+    cat_mgr.add_category("Hải sản")
+    assert "hải sản" in cat_mgr.valid_name_set_normalized()
+    pm.import_csv(out, validate_categories=True)
+    assert pm.get_product("SP351").category == "Hải sản"
+
+
+def test_feather_storage_roundtrip(tmp_path, temp_category_manager, monkeypatch):
+    pytest.importorskip("pyarrow")
+    import src.inventory.product_manager as pm_module
+    from src.inventory.product_manager import ProductManager
+
+    temp_category_manager.add_category("Gia vị")
+    path = tmp_path / "products.feather"
+    pm = ProductManager(storage_file=path, category_mgr=temp_category_manager)
+    pm.add_product("SP361", "Ớt, bột", "Gia vị", "1000.50", 2000, 5, 1, "gói")
+    pm.add_product("SP362", "Hạt nêm", "Gia vị", 1000, 2000, 0, 1, "gói")
+    assert path.read_bytes()[:6] == b"ARROW1"
+
+    pm2 = ProductManager(storage_file=path, category_mgr=temp_category_manager)
+    assert [p.to_dict() for p in pm2.products] == [p.to_dict() for p in pm.products]
+
+    writes = []
+    real_open = pm_module.atomic_open
+    monkeypatch.setattr(pm_module, "atomic_open", lambda *a, **k: (writes.append(1), real_open(*a, **k))[1])
+    pm2._save_products()
+    assert writes == []
+
+
+def test_product_batch_manager_frame_cached(temp_product_manager):
+    pytest.importorskip("pandas")
+    from src.inventory import product_batch
+
+    pm = temp_product_manager
+    pm.products = []
+    pm.add_product("SP371", "Dầu ăn", "Thực phẩm", 1000, 2000, 0, 1, "chai")
+    pm.add_product("SP372", "Dầu gội", "Thực phẩm", 1000, 2000, 9, 1, "chai")
+    df = product_batch.manager_frame(pm)
+    assert product_batch.manager_frame(pm) is df
+    assert list(df.loc[product_batch.search_mask(df, "DẦU GỘI"), "product_id"]) == ["SP372"]
+    assert list(df.loc[product_batch.low_stock_mask(df), "product_id"]) == ["SP371"]
+
+    pm.apply_stock_change("SP372", -9)
+    df2 = product_batch.manager_frame(pm)
+    assert df2 is not df
+    assert list(df2.loc[product_batch.low_stock_mask(df2), "product_id"]) == ["SP371", "SP372"]
+
+
+def test_wal_appends_ops_and_compacts(tmp_path, temp_category_manager):
+    from src.inventory.product_manager import ProductManager
+
+    temp_category_manager.add_category("Gia vị")
+    path = tmp_path / "products.json"
+    wal = tmp_path / "products.json.wal"
+    pm = ProductManager(storage_file=path, category_mgr=temp_category_manager, use_wal=True)
+    with pm.batch():
+        for i in range(20):
+            pm.add_product(f"SP4{i:02d}", f"Gia vị {i}", "Gia vị", 1000, 2000, 10, 1, "gói")
+    assert not wal.exists()
+    snapshot = path.read_bytes()
+
+    pm.apply_stock_change("SP400", -3)
+    pm.delete_product("SP401")
+    assert path.read_bytes() == snapshot  # chỉ WAL thay đổi
+    assert len(wal.read_bytes().splitlines()) == 2
+
+    # manager mới (kể cả không bật WAL) replay WAL rồi gộp vào file chính
+    pm2 = ProductManager(storage_file=path, category_mgr=temp_category_manager)
+    assert pm2.get_product("SP400").stock_quantity == 7
+    assert "SP401" not in [p.product_id for p in pm2.products]
+    assert not wal.exists()
+
+    # WAL vượt ngưỡng → compaction
+    pm3 = ProductManager(storage_file=path, category_mgr=temp_category_manager, use_wal=True)
+    for _ in range(30):
+        pm3.apply_stock_change("SP402", 1)
+    assert not wal.exists() or wal.stat().st_size <= path.stat().st_size * 0.5
+    assert ProductManager(storage_file=path, category_mgr=temp_category_manager).get_product("SP402").stock_quantity == 40
+
+
+def test_wal_replay_ignores_torn_tail(tmp_path, temp_category_manager):
+    from src.inventory.product_manager import ProductManager
+
+    temp_category_manager.add_category("Gia vị")
+    path = tmp_path / "products.json"
+    pm = ProductManager(storage_file=path, category_mgr=temp_category_manager, use_wal=True)
+    with pm.batch():
+        for i in range(20):
+            pm.add_product(f"SP5{i:02d}", f"Gia vị {i}", "Gia vị", 1000, 2000, 10, 1, "gói")
+    pm.apply_stock_change("SP500", 5)
+    wal = tmp_path / "products.json.wal"
+    with wal.open("ab") as f:
+        f.write(b'{"op":"del","id":"SP5')
+    pm2 = ProductManager(storage_file=path, category_mgr=temp_category_manager, use_wal=True)
+    assert pm2.get_product("SP500").stock_quantity == 15
+    assert len(pm2.products) == 20
+    assert not wal.exists()
+    pm2.apply_stock_change("SP500", 1)
+    assert ProductManager(storage_file=path, category_mgr=temp_category_manager).get_product("SP500").stock_quantity == 16
+
+
+def test_nested_batch_saves_once_at_outer_exit(temp_product_manager, tmp_path, monkeypatch):
+    pm = temp_product_manager
+    pm.add_product("SP381", "Gạo", "Thực phẩm", 1000, 2000, 5, 1, "kg")
+    dump = tmp_path / "dump.json"
+    pm.export_json(dump)
+
+    calls = []
+    monkeypatch.setattr(pm, "_save_products", lambda: calls.append(1))
+    with pm.batch():
+        pm.import_json(dump)  # import_json tự mở batch bên trong
+        pm.add_product("SP382", "Nếp", "Thực phẩm", 1000, 2000, 5, 1, "kg")
+        assert calls == []
+    assert calls == [1]
+
+    # dùng chính manager làm context manager = một batch
+    with pm as same:
+        assert same is pm
+        pm.add_product("SP383", "Kê", "Thực phẩm", 1000, 2000, 5, 1, "kg")
+        pm.delete_product("SP381")
+        assert calls == [1]
+    assert calls == [1, 1]
+
+
+def test_batch_shares_one_timestamp(temp_product_manager):
+    pm = temp_product_manager
+    with pm.batch():
+        a = pm.add_product("SP385", "Đậu", "Thực phẩm", 1000, 2000, 5, 1, "kg")
+        b = pm.add_product("SP386", "Lạc", "Thực phẩm", 1000, 2000, 5, 1, "kg")
+        pm.update_product("SP385", stock_quantity=9)
+    assert a.created_date == b.created_date == a.last_updated == b.last_updated
+    after = pm.update_product("SP386", stock_quantity=1)
+    assert after.last_updated > b.created_date
+
+
+def test_pyarrow_csv_reader_matches_iter_csv(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    from datetime import datetime
+    from src.inventory import product_feather
+    from src.inventory.product import Product
+    from src.utils.time_zone import VN_TZ
+
+    path = tmp_path / "p.csv"
+    path.write_text(
+        "unit,product_id,name,category,cost_price,sell_price,stock_quantity\n"
+        'gói,SP391,"Bánh ""xốp"", dừa",Bánh kẹo,1000.5,2000,3\n'
+        "\n"
+        'hộp,SP392,"Kẹo\nmới",Bánh kẹo,,,\n',
+        encoding="utf-8",
+    )
+    now = datetime(2025, 1, 1, tzinfo=VN_TZ)
+    fast = product_feather.read_csv_products(path, now)
+    slow = list(Product.iter_csv(path, now))
+    assert [p.to_dict() for p in fast] == [p.to_dict() for p in slow]
+
+    # cột số nguyên parse bằng pyarrow (int64), ô trống → 0
+    assert [(p.stock_quantity, p.min_threshold) for p in fast] == [(3, 0), (0, 0)]
+    bad_int = tmp_path / "bad_int.csv"
+    bad_int.write_text("product_id,stock_quantity\nSP394,ba\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        product_feather.read_csv_products(bad_int)
+
+    ragged = tmp_path / "ragged.csv"
+    ragged.write_text("product_id,name\nSP393\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        product_feather.read_csv_products(ragged)
+
+
+    # ProductManager dùng pyarrow.csv cho file lớn, fallback csv.reader khi dòng thiếu cột
+    import src.inventory.product_manager as pm_module
+    monkeypatch.setattr(pm_module, "PYARROW_CSV_MIN_BYTES", 0)
+    assert [p.product_id for p in pm_module.ProductManager(path).products] == ["SP391", "SP392"]
+    assert [p.product_id for p in pm_module.ProductManager(ragged).products] == ["SP393"]
+
+
+def test_convert_csv_to_feather_in_blocks(tmp_path):
+    pytest.importorskip("pyarrow")
+    from src.inventory import product_feather
+    from src.inventory.product import Product
+
+    path = tmp_path / "big.csv"
+    lines = ["product_id,name,category,cost_price,sell_price,stock_quantity,min_threshold,unit"]
+    lines += [f"SP{i:05d},Hàng {i},Bánh kẹo,1000,2000,{i},1,gói" for i in range(2000)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    out = tmp_path / "big.feather"
+    # block nhỏ để buộc ghi nhiều batch
+    assert product_feather.convert_csv(path, str(out), block_size=4096) == 2000
+    got = product_feather.read_products(out)
+    want = list(Product.iter_csv(path))
+    assert [p.product_id for p in got] == [p.product_id for p in want]
+    assert got[-1].stock_quantity == 1999
+
+    with pytest.raises(ValueError):
+        product_feather.convert_csv(path, str(out), block_size=0)
+
+
+def test_update_product_mutates_in_place(temp_product_manager):
+    pm = temp_product_manager
+    p = pm.add_product("SP401", "Gạo", "Thực phẩm", 1000, 2000, 10, 1, "kg")
+    assert pm.search_products("gạo", exact=True) == [p]
+
+    updated = pm.update_product("SP401", name="Gạo nếp", stock_quantity=7)
+    assert updated is p and p.name == "Gạo nếp" and p.stock_quantity == 7
+    assert pm.search_products("gạo nếp", exact=True) == [p]
+    assert not pm.search_products("gạo", exact=True)
+
+    # lỗi ở một field (kể cả ràng buộc liên field) → không field nào bị đổi
+    with pytest.raises(ValueError):
+        pm.update_product("SP401", stock_quantity=3, sell_price=500)
+    assert p.stock_quantity == 7 and p.sell_price == 2000
+    assert json.loads(p.to_json_bytes())["stock_quantity"] == 7
+
+
+def test_lazy_manager_loads_on_first_access(temp_product_manager, monkeypatch):
+    from src.inventory.product_manager import ProductManager
+
+    temp_product_manager.add_product("SP411", "Muối", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    path, cm = temp_product_manager.storage_file, temp_product_manager.category_mgr
+
+    calls = []
+    orig = ProductManager._load_products
+    monkeypatch.setattr(ProductManager, "_load_products", lambda self: (calls.append(1), orig(self)))
+    pm = ProductManager(path, category_mgr=cm, lazy=True)
+    assert calls == []
+    assert pm.get_product("SP411").name == "Muối"
+    assert [p.product_id for p in pm.products] == ["SP411"]
+    assert calls == [1]
+    with pytest.raises(AttributeError):
+        pm.khong_ton_tai
+
+
+def test_products_view_cached_until_change(temp_product_manager):
+    pm = temp_product_manager
+    pm.add_product("SP421", "Mì", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    view = pm.products_view()
+    assert isinstance(view, tuple) and pm.products_view() is view
+    pm.add_product("SP422", "Phở", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    assert [p.product_id for p in pm.products_view()] == ["SP421", "SP422"]
+    assert [p.product_id for p in view] == ["SP421"]  # tuple cũ không bị đổi
+
+
+def test_add_products_validates_all_then_saves_once(temp_product_manager, monkeypatch):
+    pm = temp_product_manager
+    pm.add_product("SP431", "Đường", "Thực phẩm", 1000, 2000, 5, 1, "kg")
+    row = dict(product_id="SP432", name="Muối", category="Thực phẩm", cost_price=1000,
+               sell_price=2000, stock_quantity=5, min_threshold=1, unit="gói")
+
+    calls = []
+    orig = pm._save_products
+    monkeypatch.setattr(pm, "_save_products", lambda: (calls.append(1), orig()))
+    for bad in ([row, dict(row, product_id="SP431")],          # trùng với kho
+                [row, dict(row)],                              # trùng trong lô
+                [row, dict(row, product_id="SP433", category="Không có")],
+                [row, {"product_id": "SP434"}]):               # thiếu trường
+        with pytest.raises(ValueError):
+            pm.add_products(bad)
+    assert [p.product_id for p in pm.products] == ["SP431"] and calls == []
+
+    added = pm.add_products([row, dict(row, product_id="SP433", name="Tiêu")])
+    assert [p.product_id for p in added] == ["SP432", "SP433"]
+    assert added[0].created_date == added[1].created_date
+    assert calls == [1]
+    assert pm.search_products("tiêu", exact=True) == [added[1]]
+
+
+def test_load_json_row_without_price_uses_default(tmp_path, temp_category_manager):
+    from src.inventory.product_manager import ProductManager
+    path = tmp_path / "products.json"
+    path.write_text(json.dumps([{"product_id": "SP441", "name": "Muối", "category": "Thực phẩm",
+                                 "sell_price": "2000", "stock_quantity": 3, "min_threshold": 1,
+                                 "unit": "gói"}]), encoding="utf-8")
+    pm = ProductManager(path, category_mgr=temp_category_manager)
+    assert pm.get_product("SP441").cost_price == 0
+
+
+def test_wal_failed_compaction_keeps_op(tmp_path, temp_category_manager, monkeypatch):
+    from src.inventory.product_manager import ProductManager
+
+    temp_category_manager.add_category("Gia vị")
+    path = tmp_path / "products.json"
+    pm = ProductManager(storage_file=path, category_mgr=temp_category_manager, use_wal=True)
+
+    def fail():
+        raise OSError("disk full")
+    monkeypatch.setattr(pm, "_save_products", fail)
+    # file chính chưa có → WAL vượt ngưỡng ngay → compaction lỗi nhưng add vẫn thành công
+    p = pm.add_product("SP451", "Tiêu", "Gia vị", 1000, 2000, 5, 1, "gói")
+    assert pm.products == [p]
+    pm2 = ProductManager(storage_file=path, category_mgr=temp_category_manager, use_wal=True)
+    assert [q.product_id for q in pm2.products] == ["SP451"]
+
+
+def test_wal_failed_append_rolls_back(tmp_path, temp_category_manager, monkeypatch):
+    import src.inventory.product_manager as pm_module
+    from src.inventory.product_manager import ProductManager
+
+    temp_category_manager.add_category("Gia vị")
+    path = tmp_path / "products.json"
+    pm = ProductManager(storage_file=path, category_mgr=temp_category_manager, use_wal=True)
+
+    def fail(fd):
+        raise OSError("fsync failed")
+    monkeypatch.setattr(pm_module.os, "fsync", fail)
+    with pytest.raises(OSError):
+        pm.add_product("SP452", "Quế", "Gia vị", 1000, 2000, 5, 1, "gói")
+    monkeypatch.undo()
+    assert pm.products == []
+    assert ProductManager(storage_file=path, category_mgr=temp_category_manager).products == []
+
+
+@pytest.mark.parametrize("use_batch", [True, False])
+def test_batch_exception_skips_flush(temp_product_manager, monkeypatch, use_batch):
+    pm = temp_product_manager
+    calls = []
+    monkeypatch.setattr(pm, "_save_products", lambda: calls.append(1))
+    with pytest.raises(RuntimeError, match="boom"):
+        with (pm.batch() if use_batch else pm):
+            pm.add_product("SP461", "Hồi", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+            raise RuntimeError("boom")
+    assert calls == [] and pm._dirty and pm._batch_depth == 0
+    pm.flush()  # thay đổi vẫn còn trong bộ nhớ, ghi khi caller chủ động lưu
+    assert calls == [1]
+
+
+def test_products_setter_keeps_first_duplicate(temp_product_manager, caplog):
+    import logging
+    from src.inventory.product import Product
+    pm = temp_product_manager
+    first = Product("SP471", "Bản đầu", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    other = Product("SP472", "Khác", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    dup = Product("SP471", "Bản sau", "Thực phẩm", 1000, 2000, 5, 1, "gói")
+    with caplog.at_level(logging.WARNING):
+        pm.products = [first, other, dup]
+    assert pm.products == [first, other]
+    assert pm.get_product("SP471") is first
+    assert "SP471" in caplog.text
+
+
+def test_lazy_load_error_raises_on_every_access(tmp_path, temp_category_manager):
+    from src.inventory.product_manager import ProductManager
+    path = tmp_path / "products.json"
+    row = {"product_id": "SP481", "name": "Muối", "category": "Thực phẩm", "cost_price": "1000",
+           "sell_price": "2000", "stock_quantity": -5, "min_threshold": 1, "unit": "gói"}
+    path.write_text(json.dumps([row]), encoding="utf-8")
+    pm = ProductManager(path, category_mgr=temp_category_manager, lazy=True)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            pm.products
+    # sửa file rồi truy cập lại → load thành công
+    path.write_text(json.dumps([dict(row, stock_quantity=5)]), encoding="utf-8")
+    assert [p.stock_quantity for p in pm.products] == [5]
@@ -58,6 +58,15 @@ def test_autocomplete_name(setup_env):
     assert any("Vinamilk" in s for s in suggestions), f"Got {suggestions}"
 
 
+def test_autocomplete_follows_product_updates(setup_env):
+    pm, _, se = setup_env
+    assert se.autocomplete_products("SU") == se.autocomplete_products("sữ")
+    pid = next(p.product_id for p in pm.list_products() if "Vinamilk" in p.name)
+    pm.update_product(pid, name="Bơ Vinamilk")
+    assert not any("Vinamilk" in s for s in se.autocomplete_products("sư"))
+    assert se.autocomplete_products("bo") == ["Bơ Vinamilk"]
+
+
 def test_facets_category(setup_env):
     _, _, se = setup_env
     res = se.search_products("Co")
@@ -123,3 +132,25 @@ def test_search_engine_rebuilds_on_version_change(setup_env):
     results2 = se.search_products("Trà Xanh")
     assert results2["total"] == 1
 
+
+
+def test_search_popularity_boost_and_category_filter(setup_env):
+    pm, tm, se = setup_env
+    tm.add_transaction("SP02", "EXPORT", 1)
+    res = se.search_products("co", field="name", fuzzy=False)
+    scores = {r["product_id"]: r["search_score"] for r in res["results"]}
+    # SP02 "Coca Cola": prefix (300) + 2 lần bán
+    assert scores["SP02"] == 302
+    assert se.search_products("cola", category="đồ UỐNG ", fuzzy=False)["total"] == 1
+    assert se.search_products("cola", category="Bánh kẹo", fuzzy=False)["total"] == 0
+
+
+def test_popularity_counts_cached_until_new_transaction(setup_env):
+    pm, tm, se = setup_env
+    first = se._popularity_counts()
+    assert se._popularity_counts() is first
+    assert se._get_product_popularity("SP02") == 1
+
+    tm.add_transaction("SP02", "EXPORT", 1)
+    assert se._popularity_counts() is not first
+    assert se._get_product_popularity("SP02") == 2
@@ -1,3 +1,4 @@
+import pytest
 import tempfile
 from src.utils.io_utils import atomic_write_text
 
@@ -9,3 +10,149 @@ def test_atomic_write_text():
     with open(path, "r", encoding="utf-8") as f:
         content = f.read()
     assert content == "Hello World"
+
+
+def test_json_io_roundtrip_unicode():
+    from src.utils import json_io
+    data = ["Đồ uống", "Thực phẩm"]
+    raw = json_io.dumps(data, indent=True)
+    assert isinstance(raw, bytes)
+    assert "Đồ uống".encode("utf-8") in raw
+    assert json_io.loads(raw) == data
+
+
+def test_normalize_name_ascii_only():
+    from src.utils.validators import normalize_name
+    assert normalize_name("  Nước   Suối ") == "nước suối"
+    assert normalize_name("Nước Suối", ascii_only=True) == "nuoc suoi"
+    assert normalize_name("Coca-Cola 330ml", ascii_only=True) == "cocacola 330ml"
+    assert normalize_name(None) == ""
+
+
+def test_json_io_load_path(tmp_path):
+    from src.utils import json_io
+
+    f = tmp_path / "data.json"
+    f.write_bytes(json_io.dumps(["Đồ uống", "Bánh kẹo"]))
+    assert json_io.load_path(f) == ["Đồ uống", "Bánh kẹo"]
+
+    empty = tmp_path / "empty.json"
+    empty.write_bytes(b"")
+    assert json_io.load_path(empty) is None
+
+    bad = tmp_path / "bad.json"
+    bad.write_text("[1,", encoding="utf-8")
+    with pytest.raises(json_io.JSONDecodeError):
+        json_io.load_path(bad)
+
+
+def test_json_io_load_path_hasher(tmp_path):
+    import hashlib
+    from src.utils import json_io
+
+    f = tmp_path / "data.json"
+    f.write_bytes(b'[{"a":1}]')
+    h = hashlib.sha256()
+    assert json_io.load_path(f, hasher=h) == [{"a": 1}]
+    assert h.digest() == hashlib.sha256(b'[{"a":1}]').digest()
+
+
+def test_to_decimal_fast_paths():
+    from decimal import Decimal
+    from src.utils.validators import to_decimal
+
+    assert to_decimal(15000) == Decimal("15000") and str(to_decimal(15000)) == "15000"
+    assert str(to_decimal(" 12,5 ")) == "12.5"
+    assert to_decimal("12,5") is to_decimal("12,5")
+    with pytest.raises(ValueError):
+        to_decimal(True)
+
+
+def test_ensure_int_fast_path_keeps_semantics():
+    from src.utils.validators import ensure_int
+
+    assert ensure_int(7) == 7 and ensure_int(" 8 ") == 8
+    with pytest.raises(ValueError):
+        ensure_int(0, must_be_positive=True)
+    for bad in (True, 3.5, "3.0", None):
+        with pytest.raises(ValueError):
+            ensure_int(bad)
+
+
+def test_parse_iso_datetime_cached_strings():
+    from src.utils.validators import parse_iso_datetime
+
+    a = parse_iso_datetime("2025-10-01T08:00:00")
+    b = parse_iso_datetime("2025-10-01T08:00:00")
+    assert a is b and a.tzinfo is not None
+    assert parse_iso_datetime("2025-10-01").isoformat() == "2025-10-01T00:00:00+07:00"
+    with pytest.raises(ValueError):
+        parse_iso_datetime("không phải ngày")
+    assert parse_iso_datetime("không phải ngày", default_now=True) is not None
+
+
+def test_atomic_open_discards_on_error(tmp_path):
+    from src.utils.io_utils import atomic_open
+
+    target = tmp_path / "out.txt"
+    target.write_text("cũ", encoding="utf-8")
+    with pytest.raises(RuntimeError):
+        with atomic_open(target) as f:
+            f.write("mới")
+            raise RuntimeError("lỗi giữa chừng")
+    assert target.read_text(encoding="utf-8") == "cũ"
+    assert [p.name for p in tmp_path.iterdir()] == ["out.txt"]
+
+    with atomic_open(target) as f:
+        f.write("mới")
+    assert target.read_text(encoding="utf-8") == "mới"
+
+
+def test_atomic_write_bytes_recreates_removed_dir(tmp_path):
+    import shutil
+    from src.utils.io_utils import atomic_write_bytes
+
+    target = tmp_path / "a" / "b" / "data.bin"
+    atomic_write_bytes(target, b"x" * 100_000)
+    assert target.read_bytes() == b"x" * 100_000
+    # thư mục cha đã được cache là "sẵn sàng" → bị xóa vẫn phải ghi được
+    shutil.rmtree(tmp_path / "a")
+    atomic_write_bytes(target, b"abc")
+    assert target.read_bytes() == b"abc"
+    assert [p.name for p in target.parent.iterdir()] == ["data.bin"]
+
+
+def test_ensure_parent_dir_creates_once(tmp_path, monkeypatch):
+    import os
+    from src.utils import io_utils
+
+    target = tmp_path / "x" / "y" / "f.txt"
+    assert io_utils.ensure_parent_dir(target) == str(target.parent)
+    assert target.parent.is_dir()
+    calls = []
+    monkeypatch.setattr(io_utils.os, "makedirs", lambda *a, **k: calls.append(a))
+    io_utils.ensure_parent_dir(target)
+    io_utils.ensure_parent_dir(target.parent / "g.txt")
+    assert calls == []
+
+
+def test_open_with_parent_dir_recreates_removed_dir(tmp_path, monkeypatch):
+    import shutil
+    from src.utils import io_utils
+
+    log = tmp_path / "logs" / "a.log"
+    with io_utils.open_with_parent_dir(log, "a", encoding="utf-8") as f:
+        f.write("1\n")
+    shutil.rmtree(log.parent)  # thư mục bị xóa sau khi đã cache
+    with io_utils.open_with_parent_dir(log, "a", encoding="utf-8") as f:
+        f.write("2\n")
+    assert log.read_text(encoding="utf-8") == "2\n"
+
+    # đường dẫn tương đối: cache theo đường dẫn tuyệt đối nên không lệch sau chdir
+    (tmp_path / "w1").mkdir()
+    (tmp_path / "w2").mkdir()
+    monkeypatch.chdir(tmp_path / "w1")
+    io_utils.ensure_parent_dir("rel/f.txt")
+    monkeypatch.chdir(tmp_path / "w2")
+    io_utils.ensure_parent_dir("rel/f.txt")
+    assert (tmp_path / "w2" / "rel").is_dir()